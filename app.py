@@ -1,12 +1,211 @@
-from flask import Flask
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from flask import Flask, Response, g, jsonify, request
+
+from flows import domain_column
+from metrics import observe, prometheus_text, summary
+from scoring import FLOW_NAMES, LAYOUTS, score_matrix
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+ARROW_FILE = 'application/vnd.apache.arrow.file'
+MAX_BATCH = 100000
 
 app = Flask(__name__)
 
 
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _record_latency(response):
+    observe('http_handler', time.perf_counter() - g.started, endpoint=request.endpoint or 'unknown',
+            status=response.status_code)
+    return response
+
+
 @app.route('/')
 def hello_world():  # put application's code here
     return 'Hello World!'
 
 
+@app.route('/metrics')
+def metrics():
+    """Latency histograms of this app and of every Streamlit server publishing to the metrics directory.
+
+    JSON summary rows by default; ?format=prometheus for the Prometheus text format.
+    """
+    if request.args.get('format') == 'prometheus':
+        return Response(prometheus_text(), mimetype='text/plain; version=0.0.4')
+    return jsonify({'metrics': summary()})
+
+
+# Every column a request may carry; anything else is most likely a misspelled item
+KNOWN_COLUMNS = {'exam_type', 'session_id'} | {column for layout in LAYOUTS.values() for column in layout['columns']}
+
+
+def _check_columns(present, columns):
+    """present: the request's columns; columns: the item columns of the flow being scored."""
+    unknown = sorted(set(present) - KNOWN_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    missing = [column for column in columns if column not in present]
+    if missing:
+        raise ValueError(f"Missing item columns: {', '.join(missing)}")
+
+
+def _is_item_result(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and value in (0, 1)
+
+
+def _json_matrix(rows, columns):
+    # Null items (the self-assessment attention task not given) score 0; items of the other flow must be null
+    for row in rows:
+        _check_columns(row, columns)
+        for column, value in row.items():
+            if column in ('exam_type', 'session_id') or value is None:
+                continue
+            if column not in columns:
+                raise ValueError(f"{column} is not an item of exam_type {row['exam_type']}")
+            if not _is_item_result(value):
+                raise ValueError(f"Item results must be 0 or 1, got {value!r} for {column}")
+    return np.array([[row[column] or 0 for column in columns] for row in rows], dtype=np.int16)
+
+
+def _check_arrow_column(name, column, allowed):
+    if column.null_count == len(column):
+        return
+    if not allowed:
+        raise ValueError(f"{name} must be null on rows of another exam_type")
+    if pa.types.is_boolean(column.type):
+        return
+    if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+        raise ValueError(f"Item results must be 0 or 1, got {column.type} column {name}")
+    invalid = pc.invert(pc.is_in(column, value_set=pa.array([0, 1], column.type))).fill_null(False)
+    if pc.any(invalid).as_py():
+        raise ValueError(f"Item results must be 0 or 1, got {pc.filter(column, invalid)[0]} for {name}")
+
+
+def _arrow_matrix(table, mask, columns):
+    _check_columns(table.column_names, columns)
+    selected = table.filter(pa.array(mask))
+    for name in selected.column_names:
+        if name not in ('exam_type', 'session_id'):
+            _check_arrow_column(name, selected.column(name), name in columns)
+    matrix = np.zeros((selected.num_rows, len(columns)), dtype=np.int16)
+    for j, column in enumerate(columns):
+        matrix[:, j] = pc.cast(selected.column(column), pa.int16()).fill_null(0).to_numpy()
+    return matrix
+
+
+def score_batch(exam_types, matrix_for):
+    """Score a mixed batch flow by flow; matrix_for(mask, columns) returns the item matrix of the masked rows."""
+    flows = np.array([FLOW_NAMES.get(exam_type) for exam_type in exam_types], dtype=object)
+    unknown = sorted({str(t) for t, flow in zip(exam_types, flows) if flow is None})
+    if unknown:
+        raise ValueError(f"Unknown exam_type: {', '.join(unknown)}")
+
+    n = len(flows)
+    result = {
+        'exam_type': flows,
+        'score': np.zeros(n, dtype=np.int16),
+        'normalized_score': np.zeros(n, dtype=np.int16),
+        'impaired': np.zeros(n, dtype=bool),
+        'domains': {}
+    }
+    for flow, layout in LAYOUTS.items():
+        mask = flows == flow
+        if not mask.any():
+            continue
+        scored = score_matrix(flow, matrix_for(mask, layout['columns']))
+        for key in ('score', 'normalized_score', 'impaired'):
+            result[key][mask] = scored[key]
+        for j, section in enumerate(layout['sections']):
+            # Domains of the other flow stay null
+            points = np.full(n, np.nan)
+            points[mask] = scored['domains'][:, j]
+            result['domains'][(flow, section)] = points
+    return result
+
+
+def _json_response(result, session_ids):
+    flows = result['exam_type'].tolist()
+    domains = {key: points.tolist() for key, points in result['domains'].items()}
+    results = []
+    for i, (flow, score, normalized, impaired) in enumerate(zip(flows, result['score'].tolist(),
+                                                                result['normalized_score'].tolist(),
+                                                                result['impaired'].tolist())):
+        results.append({
+            'session_id': session_ids[i],
+            'exam_type': flow,
+            'score': score,
+            'normalized_score': normalized,
+            'impaired': impaired,
+            'domains': {section: int(points[i]) for (domain_flow, section), points in domains.items()
+                        if domain_flow == flow}
+        })
+    return jsonify({'results': results})
+
+
+def _arrow_response(result, session_ids):
+    columns = {
+        'session_id': session_ids,
+        'exam_type': pa.array(result['exam_type'].tolist(), pa.string()),
+        'score': result['score'],
+        'normalized_score': result['normalized_score'],
+        'impaired': result['impaired']
+    }
+    for (flow, section), points in result['domains'].items():
+        columns[domain_column(flow, section)] = pa.array(points, pa.int16(), from_pandas=True)
+    sink = pa.BufferOutputStream()
+    table = pa.table(columns)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_STREAM)
+
+
+@app.route('/score', methods=['POST'])
+def score():
+    """Score a batch of assessments from item-level results.
+
+    JSON: {"assessments": [{"exam_type": "examiner", "session_id": ..., "<item column>": 0 | 1, ...}]}
+    Arrow IPC (stream or file): one row per assessment with the same columns; the reply is an Arrow stream.
+    Item columns are named as in the Parquet export, e.g. examiner__recall__recall_apple. Every item of a row's
+    exam_type must be present (null for an item that was not asked); unknown columns and values other than 0 or 1
+    are rejected with 400.
+    """
+    try:
+        if request.mimetype in (ARROW_STREAM, ARROW_FILE):
+            source = pa.py_buffer(request.get_data())
+            reader = pa.ipc.open_stream(source) if request.mimetype == ARROW_STREAM else pa.ipc.open_file(source)
+            table = reader.read_all()
+            if table.num_rows > MAX_BATCH:
+                return jsonify({'error': f"At most {MAX_BATCH} assessments per request"}), 413
+            if 'exam_type' not in table.column_names:
+                return jsonify({'error': "Missing exam_type column"}), 400
+            session_ids = table.column('session_id') if 'session_id' in table.column_names else \
+                pa.nulls(table.num_rows, pa.string())
+            result = score_batch(table.column('exam_type').to_pylist(),
+                                 lambda mask, columns: _arrow_matrix(table, mask, columns))
+            return _arrow_response(result, session_ids)
+
+        body = request.get_json(silent=True)
+        rows = body.get('assessments') if isinstance(body, dict) else body
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return jsonify({'error': "Expected a JSON list of assessments"}), 400
+        if len(rows) > MAX_BATCH:
+            return jsonify({'error': f"At most {MAX_BATCH} assessments per request"}), 413
+        result = score_batch([row.get('exam_type') for row in rows],
+                             lambda mask, columns: _json_matrix([row for row, keep in zip(rows, mask) if keep],
+                                                                columns))
+        return _json_response(result, [row.get('session_id') for row in rows])
+    except (ValueError, TypeError, pa.ArrowException) as e:
+        return jsonify({'error': str(e)}), 400
+
+
 if __name__ == '__main__':
     app.run()
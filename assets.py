@@ -0,0 +1,74 @@
+import io
+import os
+
+import streamlit as st
+from PIL import Image
+
+from metrics import timed
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+# Device pixel ratio to keep stimuli sharp on HiDPI tablets
+PIXEL_RATIO = 2
+ENCODE_FORMAT = "WEBP"
+ENCODE_QUALITY = 80
+
+# Column widths (CSS px) of the centered layout each stimulus is shown in
+THIRD_COLUMN = 220
+HALF_COLUMN = 340
+CENTER_COLUMN = 350
+FULL_WIDTH = 700
+
+# name -> (file in img/, display width)
+STIMULI = {
+    'apple': ("apple.jpeg", THIRD_COLUMN),
+    'table': ("table.jpeg", THIRD_COLUMN),
+    'kiruce': ("kiruce.jpeg", THIRD_COLUMN),
+    'fejo': ("fejo.jpeg", HALF_COLUMN),
+    's-tier': ("s-tier.jpeg", HALF_COLUMN),
+    'cookie': ("cookie.jpeg", CENTER_COLUMN),
+    'pentagon': ("pentagon.jpeg", FULL_WIDTH)
+}
+
+
+def asset_path(name):
+    return os.path.join(ASSET_DIR, STIMULI[name][0])
+
+
+def missing_assets():
+    return [asset_path(name) for name in STIMULI if not os.path.isfile(asset_path(name))]
+
+
+@st.cache_resource(show_spinner=False)
+def stimulus_image(name):
+    """Resized, re-encoded stimulus bytes; the same object is returned for the life of the process."""
+    filename, width = STIMULI[name]
+    with timed('file_io', op='stimulus_prepare'), Image.open(asset_path(name)) as image:
+        image = image.convert("RGB")
+        # thumbnail() only ever shrinks
+        image.thumbnail((width * PIXEL_RATIO, width * PIXEL_RATIO), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format=ENCODE_FORMAT, quality=ENCODE_QUALITY, method=6)
+
+    # Small originals can already beat the re-encode
+    original_size = os.path.getsize(asset_path(name))
+    if original_size <= buffer.tell():
+        with open(asset_path(name), "rb") as f:
+            return f.read()
+    return buffer.getvalue()
+
+
+def show_stimulus(name, **kwargs):
+    # Times handing the bytes to Streamlit's media store, which serves them to the browser
+    with timed('image', image=name):
+        st.image(stimulus_image(name), **kwargs)
+
+
+@st.cache_resource(show_spinner=False)
+def verify_assets():
+    """Fail fast if a stimulus is missing, then prepare every image once per process."""
+    missing = missing_assets()
+    if missing:
+        raise FileNotFoundError(f"Missing stimulus images: {', '.join(missing)}")
+    for name in STIMULI:
+        stimulus_image(name)
+    return True
@@ -0,0 +1,112 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Flush:
+    """Queued by flush(): the writer stops waiting for a fuller batch and signals once it has got this far."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BatchWriter:
+    """Background thread that hands queued items to write(items) in batches.
+
+    A batch is written once max_batch items are queued or interval seconds after its first item.
+    A failed write is retried, then the batch is logged and dropped; the thread keeps running either way.
+    """
+
+    def __init__(self, write, name, interval, max_batch, retries=3, retry_delay=0.5):
+        self.write = write
+        self.name = name
+        self.interval = interval
+        self.max_batch = max_batch
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._pending = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        self._ensure_thread()
+        self._pending.put(item)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.interval
+        while not isinstance(batch[-1], _Flush) and len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_items(self, batch):
+        items = [item for item in batch if not isinstance(item, _Flush)]
+        if not items:
+            return
+        for attempt in range(self.retries + 1):
+            try:
+                self.write(items)
+                return
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("%s: dropped %d entries after %d failed writes",
+                                     self.name, len(items), attempt + 1)
+                    return
+                logger.warning("%s: write of %d entries failed, retrying", self.name, len(items), exc_info=True)
+                time.sleep(self.retry_delay * (attempt + 1))
+
+    def _write_batch(self, batch):
+        try:
+            self._write_items(batch)
+        finally:
+            for item in batch:
+                if isinstance(item, _Flush):
+                    item.done.set()
+
+    def _loop(self):
+        while True:
+            self._write_batch(self._next_batch())
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        self._write_batch(batch)
+
+    def flush(self, timeout=None):
+        """Block until everything queued before this call has been written (or dropped after retries).
+
+        Returns False if that took longer than timeout; entries queued by other callers meanwhile are not waited for.
+        """
+        with self._lock:
+            if self._thread is None:
+                return True
+        marker = _Flush()
+        self._pending.put(marker)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not marker.done.wait(0.1):
+            with self._lock:
+                # Never wait on a writer that has died: what it left behind is written here instead
+                if not self._thread.is_alive():
+                    self._drain()
+            if deadline is not None and time.monotonic() >= deadline:
+                return marker.done.is_set()
+        return True
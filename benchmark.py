@@ -0,0 +1,431 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from zoneinfo import ZoneInfo
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mmse_app.py")
+FLOWS = ("With Examiner", "Self Examination")
+PERCENTILES = (50, 90, 95, 99)
+# What the stub geolocation providers report, in the ipapi.co format
+STUB_LOCATION = {'city': 'Nairobi', 'country_name': 'Kenya', 'region': 'Nairobi County',
+                 'latitude': -1.2864, 'longitude': 36.8172}
+STUB_TIMEZONE = 'Africa/Nairobi'
+RSS_SAMPLE_INTERVAL = 0.01
+# Dependencies the welcome screen should not need; a cold start that loads them is a regression
+HEAVY_MODULES = ('altair', 'av', 'numpy', 'pandas', 'pyarrow', 'requests', 'streamlit_webrtc', 'timezonefinder')
+
+
+def start_stub_providers(count=3, latency=0.0):
+    """Local HTTP servers standing in for the geolocation providers; returns (urls, servers)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps(STUB_LOCATION).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    servers = []
+    for _ in range(count):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return [f"http://127.0.0.1:{server.server_address[1]}/json/" for server in servers], servers
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # No procfs: fall back to the process-wide peak
+        return peak_rss()
+
+
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _init_worker(services, data_dir):
+    # Every worker writes to the run's scratch directory, never to the real data/
+    os.environ.update({
+        'MMSE_SESSION_DB': os.path.join(data_dir, "sessions.sqlite3"),
+        'MMSE_EXPORT_DIR': os.path.join(data_dir, "assessments"),
+        'MMSE_PATIENT_DB': os.path.join(data_dir, "patients.sqlite3"),
+        'MMSE_BLOB_DIR': os.path.join(data_dir, "blobs"),
+        'MMSE_METRICS_DIR': os.path.join(data_dir, "metrics"),
+    })
+    os.environ.pop('MMSE_OFFLINE', None)
+    # Stimulus images and other assets are found relative to the app
+    os.chdir(os.path.dirname(APP_PATH))
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    from streamlit.testing.v1 import AppTest
+
+    import geolocation
+    from startup import preload_modules
+    geolocation.LOCATION_SERVICES[:] = services
+    # Lazy imports and first-run caches are paid here, not by the first measured session;
+    # cold starts are what measure_startup() times
+    preload_modules()
+    AppTest.from_file(APP_PATH, default_timeout=120).run()
+
+
+def _drive_examiner(at, step, name):
+    step("welcome", lambda: at.radio[0].set_value("With Examiner").run())
+    step("start", lambda: at.button[0].click().run(), navigates=True)
+    step("patient_name", lambda: at.text_input[0].input(name).run())
+    step("examiner_name", lambda: at.text_input[1].input("Examiner").run())
+    step("begin", lambda: at.button(key="Begin Assessment").click().run(), navigates=True)
+    for page in range(2, 12):
+        for radio in at.radio:
+            if radio.options[0] == "Awaiting Response":
+                radio.set_value(radio.options[1])
+        step(f"page{page}_answer", lambda: at.run())
+        step(f"page{page}_next", lambda: at.button(key=f"Page{page}").click().run(), navigates=True)
+    step("cookie_test_complete",
+         lambda: next(b for b in at.button if b.label == "Complete Test").click().run(), navigates=True)
+
+
+def _drive_self(at, step, name):
+    def next_page(label):
+        step(label, lambda: next(b for b in at.button if b.label in ("Next", "Begin Test")).click().run(),
+             navigates=True)
+
+    step("welcome", lambda: at.radio[0].set_value("Self Examination").run())
+    step("start", lambda: at.button[0].click().run(), navigates=True)
+    step("patient_name", lambda: at.text_input[0].input(name).run())
+    next_page("patient_next")
+
+    now = datetime.now(ZoneInfo(STUB_TIMEZONE))
+    at.text_input[0].input(str(now.year))
+    at.text_input[1].input(str(now.day))
+    at.selectbox[0].set_value(now.strftime('%B'))
+    at.selectbox[2].set_value(now.strftime('%A'))
+    step("time_answer", lambda: at.run())
+    next_page("time_next")
+
+    for i, answer in enumerate(("Nairobi", "Kenya", "Nairobi")):
+        at.text_input[i].input(answer)
+    step("place_answer", lambda: at.run())
+    next_page("place_next")
+
+    for i, answer in enumerate(("apple", "table", "coin")):
+        at.text_input(key=f"response{i + 1}").input(answer)
+    step("registration_answer", lambda: at.run())
+    next_page("registration_next")
+
+    for i, answer in enumerate((93, 86, 79, 72, 65)):
+        at.number_input[i].set_value(answer)
+    step("attention_answer", lambda: at.run())
+    next_page("attention_next")
+
+    for i, answer in enumerate(("coin", "apple", "table")):
+        at.text_input[i].input(answer)
+    step("recall_answer", lambda: at.run())
+    next_page("recall_next")
+
+    at.text_input(key="pencil").input("pencil")
+    at.text_input(key="watch").input("watch")
+    step("naming_answer", lambda: at.run())
+    next_page("naming_next")
+    step("cookie_test_complete",
+         lambda: next(b for b in at.button if b.label == "Complete Test").click().run(), navigates=True)
+
+
+DRIVERS = {"With Examiner": _drive_examiner, "Self Examination": _drive_self}
+
+
+def drop_stale_widgets(block):
+    """Remove widgets a run cut short by st.rerun() left in the AppTest tree, as a browser would.
+
+    Streamlit has already dropped their state, so at.run() would fail reading it.
+    """
+    from streamlit.testing.v1.element_tree import Widget
+
+    for index, node in list(block.children.items()):
+        if isinstance(node, Widget):
+            try:
+                node.value
+            except KeyError:
+                del block.children[index]
+        elif hasattr(node, 'children'):
+            drop_stale_widgets(node)
+
+
+def run_session(flow, index):
+    """One complete simulated exam; returns its per-rerun latencies and peak RSS."""
+    from streamlit.testing.v1 import AppTest
+
+    import geolocation
+
+    # Each simulated session is a different client, so none reuses another's location
+    geolocation.clear_location_cache()
+    baseline = current_rss()
+    peak = [baseline]
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.wait(RSS_SAMPLE_INTERVAL):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    latencies = []
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+
+    def step(label, action, navigates=False):
+        started = time.perf_counter()
+        action()
+        latencies.append((label, time.perf_counter() - started))
+        if at.exception:
+            raise RuntimeError(f"{label}: {at.exception[0].message}")
+        if navigates:
+            # AppTest keeps the previous page's elements after st.rerun(); this is the rerun
+            # a browser would see. Drivers look widgets up again afterwards, never reusing the old page's.
+            drop_stale_widgets(at.main)
+            drop_stale_widgets(at.sidebar)
+            started = time.perf_counter()
+            at.run()
+            latencies.append((f"{label}_rerun", time.perf_counter() - started))
+
+    started_at = time.time()
+    error = None
+    try:
+        step("load", lambda: at.run())
+        DRIVERS[flow](at, step, f"Benchmark Patient {index}")
+        if "Assessment Complete" not in [subheader.value for subheader in at.subheader]:
+            raise RuntimeError(f"Finished on page {at.session_state.page}, not the summary")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sampling.set()
+        sampler.join()
+    return {
+        'flow': flow,
+        'started_at': started_at,
+        'finished_at': time.time(),
+        'latencies': latencies,
+        'baseline_rss': baseline,
+        'peak_rss': max(peak[0], current_rss()),
+        'error': error
+    }
+
+
+def _percentile(ordered, p):
+    # Linear interpolation between closest ranks, like numpy.percentile
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _percentiles(values, scale=1.0):
+    # Plain Python, so the startup probe's interpreter has nothing preloaded
+    if not values:
+        return {'count': 0}
+    ordered = sorted(value * scale for value in values)
+    stats = {f"p{p}": round(_percentile(ordered, p), 2) for p in PERCENTILES}
+    stats.update(count=len(ordered), mean=round(sum(ordered) / len(ordered), 2), max=round(ordered[-1], 2))
+    return stats
+
+
+def _probe_startup():
+    """Runs in a fresh interpreter: import Streamlit, then render the welcome screen once."""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    imported = time.perf_counter()
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    rendered = time.perf_counter()
+    print(json.dumps({
+        'streamlit_import_s': imported - started,
+        'first_render_s': rendered - imported,
+        'heavy_modules': sorted(name for name in HEAVY_MODULES if name in sys.modules),
+        'error': at.exception[0].message if at.exception else None
+    }))
+
+
+def measure_startup(runs=3):
+    """Cold-start cost of a worker: each run is a new interpreter rendering the welcome screen."""
+    probes = []
+    with tempfile.TemporaryDirectory(prefix="mmse-startup-") as data_dir:
+        env = {**os.environ, 'MMSE_METRICS_DIR': os.path.join(data_dir, "metrics")}
+        env.pop('MMSE_WARM_UP', None)
+        for _ in range(runs):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--probe-startup'],
+                                       cwd=os.path.dirname(APP_PATH), env=env, capture_output=True, text=True)
+            elapsed = time.perf_counter() - started
+            if completed.returncode != 0:
+                probes.append({'error': completed.stderr.strip().splitlines()[-1]})
+                continue
+            probes.append({**json.loads(completed.stdout.strip().splitlines()[-1]), 'process_s': elapsed})
+    ok = [probe for probe in probes if probe.get('error') is None]
+    return {
+        'runs': runs,
+        'first_render_ms': _percentiles([probe['first_render_s'] for probe in ok], 1000),
+        'streamlit_import_ms': _percentiles([probe['streamlit_import_s'] for probe in ok], 1000),
+        'process_ms': _percentiles([probe['process_s'] for probe in ok], 1000),
+        'heavy_modules_loaded': sorted({name for probe in ok for name in probe['heavy_modules']}),
+        'errors': [probe['error'] for probe in probes if probe.get('error') is not None]
+    }
+
+
+def summarize(sessions):
+    completed = [s for s in sessions if s['error'] is None]
+    wall = max(s['finished_at'] for s in sessions) - min(s['started_at'] for s in sessions)
+    latencies = [seconds for s in completed for _, seconds in s['latencies']]
+    mb = 1 / 1024 ** 2
+    summary = {
+        'wall_seconds': round(wall, 2),
+        'completed': len(completed),
+        'failed': len(sessions) - len(completed),
+        'sessions_per_minute': round(len(completed) / wall * 60, 2) if wall else None,
+        'reruns_per_second': round(len(latencies) / wall, 2) if wall else None,
+        'rerun_latency_ms': _percentiles(latencies, 1000),
+        'peak_rss_mb': _percentiles([s['peak_rss'] for s in completed], mb),
+        'session_rss_growth_mb': _percentiles([s['peak_rss'] - s['baseline_rss'] for s in completed], mb),
+    }
+    flows = {}
+    for flow in FLOWS:
+        runs = [s for s in completed if s['flow'] == flow]
+        if not runs:
+            continue
+        steps = {}
+        for run in runs:
+            for label, seconds in run['latencies']:
+                steps.setdefault(label, []).append(seconds)
+        flows[flow] = {
+            'sessions': len(runs),
+            'session_seconds': _percentiles([s['finished_at'] - s['started_at'] for s in runs]),
+            'rerun_latency_ms': _percentiles([seconds for s in runs for _, seconds in s['latencies']], 1000),
+            'steps_ms': {label: _percentiles(values, 1000) for label, values in steps.items()}
+        }
+    return summary, flows
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(APP_PATH),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sessions=8, concurrency=4, flows=FLOWS, stub_latency=0.0, startup_runs=3):
+    """Measure cold starts, then run sessions complete exams, concurrency at a time, alternating between flows."""
+    # Cold starts are measured first, on an otherwise idle machine
+    startup = measure_startup(startup_runs) if startup_runs else None
+    if not sessions:
+        return _result(sessions, concurrency, flows, stub_latency, startup, [])
+    urls, servers = start_stub_providers(latency=stub_latency)
+    try:
+        with tempfile.TemporaryDirectory(prefix="mmse-benchmark-") as data_dir:
+            # Spawned rather than forked: AppTest and the app's thread pools don't survive a fork
+            with ProcessPoolExecutor(max_workers=concurrency, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(urls, data_dir)) as pool:
+                futures = [pool.submit(run_session, flows[i % len(flows)], i) for i in range(sessions)]
+                results = [future.result() for future in futures]
+    finally:
+        for server in servers:
+            server.shutdown()
+    return _result(sessions, concurrency, flows, stub_latency, startup, results)
+
+
+def _result(sessions, concurrency, flows, stub_latency, startup, results):
+    summary, by_flow = summarize(results) if results else ({}, {})
+    return {
+        'meta': {
+            'created_at': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sessions': sessions,
+            'concurrency': concurrency,
+            'flows': list(flows),
+            'stub_latency_ms': stub_latency * 1000
+        },
+        'startup': startup,
+        'summary': summary,
+        'flows': by_flow,
+        'errors': [f"{s['flow']}: {s['error']}" for s in results if s['error']] +
+                  [f"startup: {error}" for error in (startup or {}).get('errors', [])]
+    }
+
+
+def compare(current, baseline):
+    """Relative change of the headline numbers against an earlier result file."""
+    lines = []
+    for path in (('startup', 'first_render_ms', 'p50'), ('startup', 'process_ms', 'p50'),
+                 ('summary', 'rerun_latency_ms', 'p50'), ('summary', 'rerun_latency_ms', 'p95'),
+                 ('summary', 'rerun_latency_ms', 'p99'), ('summary', 'peak_rss_mb', 'p95'),
+                 ('summary', 'sessions_per_minute')):
+        new, old = current, baseline
+        for key in path:
+            new, old = (new or {}).get(key), (old or {}).get(key)
+        if new is None or not old:
+            continue
+        lines.append(f"{'.'.join(path[1:])}: {old} -> {new} ({(new - old) / old:+.1%})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session benchmark of the MMSE Streamlit flows")
+    parser.add_argument('--sessions', type=int, default=8, help="complete exams to run")
+    parser.add_argument('--concurrency', type=int, default=4, help="sessions running at once")
+    parser.add_argument('--flow', choices=('both', 'examiner', 'self'), default='both')
+    parser.add_argument('--stub-latency', type=float, default=50, help="geolocation stub response time (ms)")
+    parser.add_argument('--output', help="result file (default: benchmarks/<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier result file to compare against")
+    parser.add_argument('--startup-runs', type=int, default=3,
+                        help="cold starts to time up to the first rendered welcome screen (0 to skip)")
+    parser.add_argument('--probe-startup', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.probe_startup:
+        _probe_startup()
+        return
+
+    flows = {'both': FLOWS, 'examiner': FLOWS[:1], 'self': FLOWS[1:]}[args.flow]
+    result = run_benchmark(args.sessions, args.concurrency, flows, args.stub_latency / 1000, args.startup_runs)
+    output = args.output or os.path.join("benchmarks", f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(json.dumps({'startup': result['startup'], 'summary': result['summary']}, indent=2))
+    for error in result['errors']:
+        print(f"FAILED {error}")
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(result, json.load(f)):
+                print(line)
+    print(f"Saved {output}")
+    if result['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    # Workers look functions up by module name, and AppTest takes over __main__ there
+    from benchmark import main
+    main()
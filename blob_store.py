@@ -0,0 +1,180 @@
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import streamlit as st
+from packaging.version import Version
+from PIL import Image, ImageOps
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from metrics import timed
+from session_store import READ_FLUSH_TIMEOUT, connect, flush
+from uploads import save_upload, upload_digest
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.environ.get('MMSE_BLOB_DIR', os.path.join("data", "blobs"))
+MAX_BLOB_BYTES = 20 * 1024 * 1024
+MAX_STORE_BYTES = int(os.environ.get('MMSE_BLOB_STORE_BYTES', 2 * 1024 ** 3))
+# Blobs no journaled session refers to are kept this long (seconds) before eviction,
+# so an upload made just before its session's next checkpoint is never lost
+ORPHAN_AGE = 24 * 3600
+EVICT_INTERVAL = 600
+THUMBNAIL_SIZE = 320
+# Streamlit releases whose (private) uploaded-file manager _release_upload has been checked against
+RELEASE_UPLOAD_VERSIONS = ('1.41',)
+
+_evict_lock = threading.Lock()
+_last_eviction = None
+
+
+def blob_path(handle):
+    return os.path.join(BLOB_DIR, handle['blob'])
+
+
+def blob_exists(handle):
+    return os.path.exists(blob_path(handle))
+
+
+def read_blob(handle):
+    with timed('file_io', op='blob_read'), open(blob_path(handle), "rb") as f:
+        return f.read()
+
+
+def store_size():
+    if not os.path.isdir(BLOB_DIR):
+        return 0
+    return sum(entry.stat().st_size for entry in os.scandir(BLOB_DIR) if entry.is_file())
+
+
+def referenced_blobs():
+    """Blob IDs in the latest journaled state of every session; None if the journal could not be caught up."""
+    if not flush(READ_FLUSH_TIMEOUT):
+        return None
+    conn = connect()
+    try:
+        rows = conn.execute("SELECT state FROM journal WHERE seq IN "
+                            "(SELECT MAX(seq) FROM journal GROUP BY session_id)").fetchall()
+    finally:
+        conn.close()
+    live = set()
+    for (state,) in rows:
+        for value in json.loads(state)['responses'].values():
+            if isinstance(value, dict) and 'blob' in value:
+                live.add(value['blob'])
+    return live
+
+
+def evict_orphans(max_age=ORPHAN_AGE):
+    """Delete blobs (and abandoned partial writes) older than max_age that no session refers to; returns bytes freed."""
+    if not os.path.isdir(BLOB_DIR):
+        return 0
+    live = referenced_blobs()
+    if live is None:
+        # A queued, uncommitted entry may refer to a blob that looks orphaned; try again later
+        return 0
+    cutoff = time.time() - max_age
+    freed = 0
+    for entry in os.scandir(BLOB_DIR):
+        if not entry.is_file() or entry.name in live:
+            continue
+        stat = entry.stat()
+        if stat.st_mtime < cutoff:
+            try:
+                os.unlink(entry.path)
+                freed += stat.st_size
+            except FileNotFoundError:
+                # Another process evicted it first
+                pass
+    return freed
+
+
+def _maybe_evict():
+    global _last_eviction
+    with _evict_lock:
+        if _last_eviction is not None and time.monotonic() - _last_eviction < EVICT_INTERVAL:
+            return
+        _last_eviction = time.monotonic()
+    threading.Thread(target=evict_orphans, name='blob-eviction', daemon=True).start()
+
+
+def store_blob(upload):
+    """Content-addressed save of an upload; returns a small JSON-safe handle to it."""
+    if upload.size > MAX_BLOB_BYTES:
+        raise ValueError(f"File is too large ({upload.size / 1024 ** 2:.1f} MB); "
+                         f"the limit is {MAX_BLOB_BYTES // 1024 ** 2} MB")
+    handle = {'blob': upload_digest(upload), 'name': upload.name, 'type': upload.type, 'size': upload.size}
+    path = blob_path(handle)
+    if os.path.exists(path):
+        # Restarts the orphan clock for a re-uploaded file
+        os.utime(path)
+    else:
+        if store_size() + upload.size > MAX_STORE_BYTES:
+            evict_orphans()
+        if store_size() + upload.size > MAX_STORE_BYTES:
+            raise ValueError("Drawing storage is full; please contact the administrator")
+        save_upload(upload, path)
+    _maybe_evict()
+    return handle
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    with Image.open(path) as image:
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    image.thumbnail((size, size))
+    out = io.BytesIO()
+    image.save(out, 'WEBP', quality=75)
+    return out.getvalue()
+
+
+def _can_release_uploads():
+    version = Version(st.__version__)
+    if f"{version.major}.{version.minor}" in RELEASE_UPLOAD_VERSIONS:
+        return True
+    logger.warning("Streamlit %s is untested with _release_upload; stored uploads stay in memory until "
+                   "their session ends", st.__version__)
+    return False
+
+
+_release_uploads = _can_release_uploads()
+
+
+def _release_upload(upload):
+    # Streamlit keeps an upload's bytes for the life of the session unless the browser deletes it. There is
+    # no public API for this, so it is only done on the versions above and never allowed to fail the upload.
+    ctx = get_script_run_ctx()
+    if not _release_uploads or ctx is None or not runtime.exists():
+        return
+    try:
+        runtime.get_instance().uploaded_file_mgr.remove_file(ctx.session_id, upload.file_id)
+    except Exception:
+        logger.warning("Could not release upload %s from memory", upload.file_id, exc_info=True)
+
+
+def persist_blob(upload):
+    """Move an upload out of server memory: store it, keep its thumbnail, return the handle."""
+    handle = store_blob(upload)
+    st.session_state.setdefault('blob_thumbnails', {})[handle['blob']] = make_thumbnail(blob_path(handle))
+    _release_upload(upload)
+    return handle
+
+
+def thumbnail(handle):
+    thumbnails = st.session_state.setdefault('blob_thumbnails', {})
+    if handle['blob'] not in thumbnails:
+        # Resumed sessions only carry the handle
+        thumbnails[handle['blob']] = make_thumbnail(blob_path(handle))
+    return thumbnails[handle['blob']]
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['evict']:
+        print("Usage: python blob_store.py evict")
+        sys.exit(1)
+    print(f"Freed {evict_orphans() / 1024 ** 2:.1f} MB")
@@ -1,8 +1,11 @@
 import streamlit as st
-from datetime import datetime
 import os
 
-from mmse_app import next_page
+from sections import next_page
+from assets import show_stimulus
+from fluency import session_fluency
+from live_capture import render_live_capture
+from recordings import RECORDINGS_DIR, persist_recording, open_playback, open_download, stored_recording
 
 
 def cookie_test():
@@ -10,47 +13,65 @@ def cookie_test():
     st.write("This test evaluates verbal fluency and description abilities.")
 
     # Create recordings directory if it doesn't exist
-    if not os.path.exists("recordings"):
-        os.makedirs("recordings")
+    if not os.path.exists(RECORDINGS_DIR):
+        os.makedirs(RECORDINGS_DIR)
 
     # Display the cookie image
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        st.image("img/cookie.jpeg", caption="Cookie Image", use_column_width=True)
+        show_stimulus("cookie", caption="Cookie Image", use_column_width=True)
         st.write("Please describe everything you see in this image in as much detail as possible.")
 
     # Recording section
     st.subheader("Record Your Description")
 
-    # Audio input for recording
-    audio_file = st.audio_input("Press the button below to record your description")
-
-    if audio_file:
-        # Save audio file
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        patient_id = st.session_state.get('patient_name', 'unknown').replace(" ", "_")
-        audio_filename = f"recordings/cookie_test_{patient_id}_{timestamp}.wav"
-
-        with open(audio_filename, 'wb') as f:
-            f.write(audio_file.read())
+    patient_id = st.session_state.get('patient_name', 'unknown').replace(" ", "_")
+    capture_mode = st.radio("Capture mode", ["Record then upload", "Live streaming"], horizontal=True,
+                            help="Live streaming saves and analyses the description while the patient speaks")
+
+    audio_filename = None
+    if capture_mode == "Live streaming":
+        audio_filename = render_live_capture(patient_id)
+    else:
+        # Audio input for recording
+        audio_file = st.audio_input("Press the button below to record your description")
+        if audio_file:
+            # Save audio file (once per distinct upload)
+            audio_filename = persist_recording(audio_file, patient_id)
+            session_fluency(audio_file)
+
+    if audio_filename:
+        # Refreshed on every rerun so it follows the recording to its FLAC archive
+        st.session_state.setdefault('responses', {})['cookie_test_recording'] = stored_recording(audio_filename)
 
         st.success(f"Audio recorded successfully and saved as {audio_filename}")
 
         # Playback section
         st.subheader("Review Recording")
-        st.audio(audio_filename)
+        playback_file, _, playback_mime = open_playback(audio_filename)
+        with playback_file:
+            st.audio(playback_file, format=playback_mime)
 
         # Volume control (manual playback volume control is typically done through the audio player UI)
 
         # Download button
-        with open(audio_filename, "rb") as file:
+        download_file, download_path, download_mime = open_download(audio_filename)
+        with download_file:
             st.download_button(
                 label="Download Recording",
-                data=file,
-                file_name=os.path.basename(audio_filename),
-                mime="audio/wav"
+                data=download_file,
+                file_name=os.path.basename(download_path),
+                mime=download_mime
             )
 
+        # Fluency analysis
+        st.subheader("Fluency Analysis")
+        fluency = st.session_state.responses['cookie_test_fluency']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Speech time (s)", fluency['speech_seconds'])
+        col2.metric("Pauses", fluency['pause_count'])
+        col3.metric("Speech/silence ratio", fluency['speech_to_silence_ratio'] or "—")
+
     # Error handling and instructions
     with st.expander("Troubleshooting"):
         st.write("""
@@ -0,0 +1,155 @@
+import os
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+from exports import EXPORT_DIR, read_assessments
+from flows import FLOWS, IMPAIRMENT_THRESHOLD, item_column, scored_items, section_domain
+
+TREND_GROUPS = {"Site": 'site', "Examiner": 'examiner_name'}
+EXAM_TYPES = {"All": None, **{label: flow for label, (flow, _, _) in FLOWS.items()}}
+
+# Item column -> domain; the same domain in both flows is pooled
+DOMAINS = pd.Series({item_column(flow, spec['name'], key): section_domain(spec)
+                     for flow, sections, _ in FLOWS.values()
+                     for spec in sections.values()
+                     for key in scored_items(spec)})
+
+
+def data_version(root=EXPORT_DIR):
+    """Cheap fingerprint of the export: Parquet file count and newest mtime. New batches change it."""
+    count, newest = 0, 0.0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith('.parquet'):
+                count += 1
+                newest = max(newest, os.path.getmtime(os.path.join(dirpath, name)))
+    return count, newest
+
+
+@st.cache_data(show_spinner="Loading assessments…", max_entries=1)
+def load_cohort(version):
+    df = read_assessments().to_pandas()
+    # A reviewed exam is exported again; only its latest result counts
+    df = df.sort_values('completed_at').drop_duplicates('session_id', keep='last')
+    df['impaired'] = df['impaired'].fillna(df['normalized_score'] <= IMPAIRMENT_THRESHOLD).astype(bool)
+    df['week'] = pd.to_datetime(df['exam_date']).dt.to_period('W').dt.start_time
+    return df.reset_index(drop=True)
+
+
+def _filtered(version, filters):
+    exam_type, sites, examiners, start, end = filters
+    df = load_cohort(version)
+    mask = (df['exam_date'] >= start) & (df['exam_date'] <= end)
+    if exam_type:
+        mask &= df['exam_type'] == exam_type
+    if sites:
+        mask &= df['site'].isin(sites)
+    if examiners:
+        mask &= df['examiner_name'].isin(examiners)
+    return df[mask]
+
+
+# Aggregations are keyed on (data version, filters): revisiting a filter combination is a cache hit
+@st.cache_data(max_entries=64)
+def filter_options(version):
+    df = load_cohort(version)
+    return {
+        'sites': sorted(df['site'].dropna().unique()),
+        'examiners': sorted(df['examiner_name'].dropna().unique()),
+        'first_date': df['exam_date'].min(),
+        'last_date': df['exam_date'].max()
+    }
+
+
+@st.cache_data(max_entries=64)
+def cohort_summary(version, filters):
+    df = _filtered(version, filters)
+    return {
+        'exams': len(df),
+        'mean_score': float(df['normalized_score'].mean()) if len(df) else None,
+        'impaired_rate': float(df['impaired'].mean()) if len(df) else None
+    }
+
+
+@st.cache_data(max_entries=64)
+def score_distribution(version, filters):
+    df = _filtered(version, filters)
+    return df.groupby(['normalized_score', 'impaired']).size().rename('exams').reset_index()
+
+
+@st.cache_data(max_entries=64)
+def domain_failure_rates(version, filters):
+    items = _filtered(version, filters)[DOMAINS.index]
+    failures = (items == 0).sum().groupby(DOMAINS).sum()
+    answered = items.notna().sum().groupby(DOMAINS).sum()
+    rates = pd.DataFrame({'failure_rate': failures / answered, 'items_scored': answered})
+    return rates[rates['items_scored'] > 0].rename_axis('domain').reset_index()
+
+
+@st.cache_data(max_entries=64)
+def score_trends(version, filters, group):
+    df = _filtered(version, filters)
+    return (df.groupby(['week', group])
+            .agg(mean_score=('normalized_score', 'mean'), impaired_rate=('impaired', 'mean'),
+                 exams=('session_id', 'size'))
+            .reset_index())
+
+
+def render_dashboard():
+    st.subheader("Cohort Dashboard")
+    version = data_version()
+    if not version[0]:
+        st.info("No completed assessments have been exported yet.")
+        return
+
+    options = filter_options(version)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        exam_type = EXAM_TYPES[st.selectbox("Exam type", list(EXAM_TYPES))]
+    with col2:
+        sites = st.multiselect("Sites", options['sites'])
+    with col3:
+        examiners = st.multiselect("Examiners", options['examiners'])
+    dates = st.date_input("Exam dates", (pd.Timestamp(options['first_date']).date(),
+                                         pd.Timestamp(options['last_date']).date()))
+    # The picker returns a single date while a range is being chosen
+    start, end = (dates[0], dates[-1]) if dates else (options['first_date'], options['last_date'])
+    filters = (exam_type, tuple(sites), tuple(examiners), str(start), str(end))
+
+    summary = cohort_summary(version, filters)
+    if not summary['exams']:
+        st.warning("No assessments match these filters.")
+        return
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Assessments", summary['exams'])
+    col2.metric("Mean score", f"{summary['mean_score']:.1f}/30")
+    col3.metric(f"Score ≤ {IMPAIRMENT_THRESHOLD}", f"{summary['impaired_rate']:.0%}")
+
+    st.write("Score distribution")
+    distribution = alt.Chart(score_distribution(version, filters)).mark_bar().encode(
+        x=alt.X('normalized_score:O', title="Score (out of 30)"),
+        y=alt.Y('exams:Q', title="Assessments"),
+        color=alt.Color('impaired:N', title="Possible impairment")
+    )
+    st.altair_chart(distribution, use_container_width=True)
+
+    st.write("Failure rate by domain")
+    failures = alt.Chart(domain_failure_rates(version, filters)).mark_bar().encode(
+        x=alt.X('failure_rate:Q', title="Items failed", axis=alt.Axis(format='%')),
+        y=alt.Y('domain:N', title=None, sort='-x'),
+        tooltip=['domain', alt.Tooltip('failure_rate:Q', format='.1%'), 'items_scored']
+    )
+    st.altair_chart(failures, use_container_width=True)
+
+    group_label = st.radio("Trend by", list(TREND_GROUPS), horizontal=True)
+    group = TREND_GROUPS[group_label]
+    trends = alt.Chart(score_trends(version, filters, group)).mark_line(point=True).encode(
+        x=alt.X('week:T', title="Week"),
+        y=alt.Y('mean_score:Q', title="Mean score", scale=alt.Scale(domain=[0, 30])),
+        color=alt.Color(f'{group}:N', title=group_label),
+        tooltip=['week:T', f'{group}:N', alt.Tooltip('mean_score:Q', format='.1f'),
+                 alt.Tooltip('impaired_rate:Q', format='.0%'), 'exams']
+    )
+    st.altair_chart(trends, use_container_width=True)
@@ -0,0 +1,161 @@
+import atexit
+import datetime
+import json
+import os
+import sys
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from batch_writer import BatchWriter
+from flows import FLOWS, IMPAIRMENT_THRESHOLD, item_column, scored_items
+from metrics import timed
+from scoring import normalize_score
+
+EXPORT_DIR = os.environ.get('MMSE_EXPORT_DIR', os.path.join("data", "assessments"))
+# Clinic or deployment the exams were taken at
+SITE = os.environ.get('MMSE_SITE', "default")
+# Parquet prefers few large files: rows are held until this many exams or this many seconds
+FLUSH_INTERVAL = 60
+MAX_BATCH = 1000
+
+PARTITION_COLUMNS = ['exam_date', 'exam_type']
+
+FLUENCY_FIELDS = ['total_seconds', 'speech_seconds', 'pause_count', 'pause_seconds_total',
+                  'speech_to_silence_ratio', 'pause_seconds_mean', 'pause_seconds_median',
+                  'pause_seconds_p90', 'pause_seconds_max']
+
+
+def _item_columns():
+    columns = {}
+    for flow, sections, _ in FLOWS.values():
+        for spec in sections.values():
+            for key in scored_items(spec):
+                columns[item_column(flow, spec['name'], key)] = (spec['name'], key)
+    return columns
+
+
+# column -> (section, item); items a flow does not ask are null
+ITEM_COLUMNS = _item_columns()
+
+SCHEMA = pa.schema(
+    [
+        ('session_id', pa.string()),
+        ('site', pa.string()),
+        ('exam_date', pa.string()),
+        ('exam_type', pa.string()),
+        ('completed_at', pa.timestamp('ms', tz='UTC')),
+        ('patient_name', pa.string()),
+        ('examiner_name', pa.string()),
+        ('consciousness', pa.string()),
+        ('registration_trials', pa.int16()),
+        ('score', pa.int16()),
+        ('max_score', pa.int16()),
+        ('normalized_score', pa.int16()),
+        ('impaired', pa.bool_())
+    ]
+    + [(f"fluency_{field}", pa.float64()) for field in FLUENCY_FIELDS]
+    + [(column, pa.int8()) for column in ITEM_COLUMNS]
+)
+# Partition values live in the directory names, not in the files
+FILE_SCHEMA = pa.schema([field for field in SCHEMA if field.name not in PARTITION_COLUMNS])
+
+def write_batch(rows, root=EXPORT_DIR):
+    """Append rows as new files under root/exam_date=.../exam_type=.../."""
+    table = pa.Table.from_pylist(rows, schema=SCHEMA)
+    with timed('file_io', op='export_write'):
+        pq.write_to_dataset(table, root, partition_cols=PARTITION_COLUMNS,
+                            existing_data_behavior='overwrite_or_ignore')
+
+
+_writer = BatchWriter(write_batch, 'assessment-export', FLUSH_INTERVAL, MAX_BATCH)
+
+
+def flush():
+    """Write out everything still queued; called at exit so no completed exam is lost."""
+    _writer.flush()
+
+
+atexit.register(flush)
+
+
+def assessment_row():
+    """The current session's completed exam as one row of SCHEMA."""
+    flow, sections, max_score = FLOWS[st.session_state.exam_type]
+    responses = st.session_state.responses
+    ledger_items = st.session_state.ledger['items']
+
+    exam_date = responses.get('exam_date') or datetime.date.today()
+    fluency = responses.get('cookie_test_fluency') or {}
+    row = {
+        'session_id': st.session_state.get('session_id'),
+        'site': SITE,
+        'exam_date': str(exam_date),
+        'exam_type': flow,
+        'completed_at': datetime.datetime.now(datetime.timezone.utc),
+        'patient_name': responses.get('patient_name'),
+        'examiner_name': responses.get('examiner_name'),
+        'consciousness': responses.get('consciousness'),
+        'registration_trials': responses.get('registration_trials'),
+        'score': st.session_state.score,
+        'max_score': max_score,
+        'normalized_score': normalize_score(st.session_state.score, max_score)
+    }
+    row['impaired'] = row['normalized_score'] <= IMPAIRMENT_THRESHOLD
+    for field in FLUENCY_FIELDS:
+        row[f"fluency_{field}"] = fluency.get(field)
+    for column, (section, key) in ITEM_COLUMNS.items():
+        if column.startswith(f"{flow}__"):
+            row[column] = ledger_items.get(section, {}).get(key)
+    return row
+
+
+def export_assessment():
+    """Queue the finished exam for export; re-queued only if the result changed after a review."""
+    row = assessment_row()
+    fingerprint = json.dumps([row['score'], st.session_state.ledger['sections'],
+                              row['consciousness'], row['fluency_total_seconds']], default=str)
+    if st.session_state.get('exported_state') == fingerprint:
+        return
+    st.session_state.exported_state = fingerprint
+    _writer.put(row)
+
+
+def compact_exports(root=EXPORT_DIR):
+    """Merge each partition's batch files into one; returns the number of files removed.
+
+    Readers may briefly see both copies of a row, which the per-session dedup already absorbs.
+    """
+    removed = 0
+    for dirpath, _, filenames in os.walk(root):
+        parts = sorted(os.path.join(dirpath, name) for name in filenames if name.endswith('.parquet'))
+        if len(parts) < 2:
+            continue
+        table = pq.read_table(parts, schema=FILE_SCHEMA, partitioning=None)
+        name = f"compact-{uuid.uuid4().hex}.parquet"
+        tmp_path = os.path.join(dirpath, f".{name}.part")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(dirpath, name))
+        for path in parts:
+            os.unlink(path)
+        removed += len(parts) - 1
+    return removed
+
+
+def read_assessments(root=EXPORT_DIR, columns=None, filters=None):
+    """Column-pruned, partition-filtered scan of the exported exams as a pyarrow Table.
+
+    A reviewed exam is exported again; keep the latest completed_at per session_id.
+    """
+    return pq.read_table(root, columns=columns, filters=filters, schema=SCHEMA,
+                         partitioning='hive')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != 'compact':
+        print("Usage: python exports.py compact [export_dir]")
+        sys.exit(1)
+    removed = compact_exports(*sys.argv[2:])
+    print(f"Removed {removed} files from {sys.argv[2] if len(sys.argv) == 3 else EXPORT_DIR}")
@@ -0,0 +1,258 @@
+import re
+
+AWAITING = "Awaiting Response"
+ANSWERED = ("Patient Answered Correctly", "Patient Answered Incorrectly")
+PERFORMED = ("Patient Performed Correctly", "Patient Performed Incorrectly")
+
+EXAMINER_TOTAL_PAGES = 13
+EXAMINER_MAX_SCORE = 30
+SELF_ASSESSMENT_MAX_SCORE = 24  # Adjusted for removed questions
+# Scores (out of 30) at or below this suggest cognitive impairment
+IMPAIRMENT_THRESHOLD = 23
+
+
+def item(prompt, key, label, **extra):
+    return dict(prompt=prompt, key=key, label=label, **extra)
+
+
+# Examiner flow, keyed by page. 'items' sections are rendered generically from their spec;
+# any other kind is looked up in the renderers passed to render_section().
+EXAMINER_SECTIONS = {
+    1: {
+        'name': "Patient Information",
+        'kind': 'examiner_patient_info'
+    },
+    2: {
+        'name': "Orientation to Time",
+        'kind': 'items',
+        'title': "Orientation to Time (5 points)",
+        'instructions': ["Ask: 'What is the...'"],
+        'items': [item(q, key, f"Response for {q}") for q, key in [
+            ("Year?", "year_response"),
+            ("Season?", "season_response"),
+            ("Month of the year?", "month_response"),
+            ("Day of the week?", "day_response"),
+            ("Date?", "date_response")
+        ]],
+        'options': ANSWERED,
+        'help': "Select the appropriate response based on patient's answer",
+        'warning': "Please evaluate all responses before proceeding"
+    },
+    3: {
+        'name': "Orientation to Place",
+        'kind': 'items',
+        'title': "Orientation to Place (5 points)",
+        'instructions': ["Ask: 'Where are we...'"],
+        'items': [item(q, key, f"Evaluation for {q}") for q, key in [
+            ("State?", "state_response"),
+            ("County?", "county_response"),
+            ("Town/City?", "city_response"),
+            ("Hospital/Facility?", "facility_response"),
+            ("Floor?", "floor_response")
+        ]],
+        'item_caption': "Record patient's response to location question",
+        'options': ANSWERED,
+        'help': "Select whether the patient correctly identified this location",
+        'warning': "⚠️ Please complete all evaluations before proceeding"
+    },
+    4: {
+        'name': "Registration",
+        'kind': 'items',
+        'title': "Registration (3 points)",
+        'instructions': [
+            "Instructions: Name three objects (Apple, Penny, Table). "
+            "Take one second to say each. Ask the patient to repeat all three.",
+            "Score one point for each correct answer on the first trial."
+        ],
+        'items': [item(f"Said '{obj}'", key, f"Patient's recall of '{obj}'") for obj, key in [
+            ("Apple", "apple_response"),
+            ("Penny", "penny_response"),
+            ("Table", "table_response")
+        ]],
+        'item_caption': "Evaluate patient's immediate recall of this word",
+        'options': ANSWERED,
+        'help': "Select whether the patient correctly repeated this word",
+        'extras': ['registration_trials'],
+        'warning': "⚠️ Please evaluate all responses before proceeding"
+    },
+    5: {
+        'name': "Attention and Calculation",
+        'kind': 'items',
+        'title': "Attention and Calculation (5 points)",
+        'instructions': ["Instructions: Ask the patient to begin with 100 and count "
+                         "backwards by 7. Stop after 5 subtractions."],
+        'caption': "Each subtraction is scored independently. Any error makes that step incorrect.",
+        'items': [item(calc, key, f"Evaluation for {calc}") for calc, key in [
+            ("100 - 7 = 93", "calc1_response"),
+            ("93 - 7 = 86", "calc2_response"),
+            ("86 - 7 = 79", "calc3_response"),
+            ("79 - 7 = 72", "calc4_response"),
+            ("72 - 7 = 65", "calc5_response")
+        ]],
+        'item_caption': "Evaluate this specific calculation step",
+        'options': ANSWERED,
+        'help': "Select whether the patient calculated this step correctly",
+        'warning': "⚠️ Please evaluate all calculations before proceeding"
+    },
+    6: {
+        'name': "Recall",
+        'kind': 'items',
+        'title': "Recall (3 points)",
+        'instructions': ["Ask: 'What were the three objects I asked you to remember?'"],
+        'caption': "Test delayed recall of the three objects from the Registration section",
+        'items': [item(f"Recalled '{obj}'?", key, f"Patient's recall of '{obj}'") for obj, key in [
+            ("Apple", "recall_apple"),
+            ("Penny", "recall_penny"),
+            ("Table", "recall_table")
+        ]],
+        'item_caption': "Evaluate patient's delayed recall of this word",
+        'options': ANSWERED,
+        'help': "Select whether the patient correctly remembered this word",
+        'warning': "⚠️ Please evaluate all recall responses before proceeding"
+    },
+    7: {
+        'name': "Naming",
+        'kind': 'items',
+        'title': "Naming (2 points)",
+        'instructions': ["Show the patient these objects and ask them to name them:"],
+        'caption': "Score one point for each object correctly named",
+        'items': [item(f"Naming '{obj}'", key, f"Patient's naming of '{obj}'") for obj, key in [
+            ("Watch", "name_watch"),
+            ("Pencil", "name_pencil")
+        ]],
+        'item_caption': "Patient should identify this object without assistance",
+        'options': ANSWERED,
+        'help': "Select whether the patient correctly named this object",
+        'warning': "⚠️ Please evaluate all naming responses before proceeding"
+    },
+    8: {
+        'name': "Repetition",
+        'kind': 'items',
+        'title': "Repetition (1 point)",
+        'instructions': ["Instructions: Ask the patient to repeat: 'No ifs, ands, or buts'"],
+        'caption': "Patient must repeat the phrase exactly as stated",
+        'items': [item("Patient's phrase repetition", "phrase_repetition", "Phrase repetition evaluation",
+                       caption="Evaluate accuracy of the entire phrase")],
+        'options': ("Patient Repeated Correctly", "Patient Repeated Incorrectly"),
+        'help': "Select whether the patient repeated the entire phrase correctly",
+        'warning': "⚠️ Please evaluate the phrase repetition before proceeding"
+    },
+    9: {
+        'name': "3-Stage Command",
+        'kind': 'items',
+        'title': "3-Stage Command (3 points)",
+        'instructions': ["Instructions: Give the patient a plain piece of paper and say: "
+                         "'Take the paper in your right hand, fold it in half, and put it on the floor.'"],
+        'caption': "Score one point for each part correctly executed",
+        'items': [item(command, key, f"Evaluation of '{command}'") for command, key in [
+            ("Took paper in right hand", "command_hand"),
+            ("Folded paper in half", "command_fold"),
+            ("Put paper on floor", "command_floor")
+        ]],
+        'item_caption': "Evaluate this specific action",
+        'options': PERFORMED,
+        'help': "Select whether the patient performed this action correctly",
+        'warning': "⚠️ Please evaluate all commands before proceeding"
+    },
+    10: {
+        'name': "Reading and Writing",
+        'kind': 'items',
+        'title': "Reading and Writing (2 points)",
+        'caption': "Two separate tasks: reading comprehension and sentence writing",
+        'items': [
+            item("1. Show the patient the words: 'CLOSE YOUR EYES' Ask them to read and do what it says.",
+                 "reading_response", "Reading comprehension evaluation",
+                 caption="Patient should read and perform the action",
+                 help="Select whether the patient both read and performed the action"),
+            item("2. Ask the patient to write a complete sentence.",
+                 "writing_response", "Writing evaluation",
+                 caption="Sentence must contain a subject and verb and make sense",
+                 options=("Patient Wrote Correctly", "Patient Wrote Incorrectly"),
+                 help="Select whether the patient wrote a complete, sensible sentence")
+        ],
+        'options': PERFORMED,
+        'extras': ['written_sentence'],
+        'warning': "⚠️ Please evaluate both reading and writing tasks before proceeding"
+    },
+    11: {
+        'name': "Copying",
+        'kind': 'items',
+        'title': "Copying (1 point)",
+        'instructions': ["Instructions: Ask the patient to copy the design shown. Allow multiple tries. "
+                         "Wait until the person is finished and take it away."],
+        'caption': "All 10 angles must be present and two must intersect",
+        'image': ("pentagon", "Intersecting Pentagons"),
+        'items': [item("Patient's design copy", "design_response", "Design copy evaluation",
+                       caption="Evaluate accuracy of the copied design")],
+        'options': ("Patient Copied Correctly", "Patient Copied Incorrectly"),
+        'help': "Select whether the patient copied the design accurately",
+        'extras': ['drawing_upload'],
+        'warning': "⚠️ Please evaluate the design copy before completing the assessment",
+        'button': "Complete Assessment"
+    },
+    12: {
+        'name': "Cookie test",
+        'kind': 'examiner_cookie_test'
+    },
+    13: {
+        'name': "Assessment Complete",
+        'kind': 'examiner_summary'
+    }
+}
+
+# Pages shown in the examiner's completed-sections checklist
+EXAMINER_CHECKLIST = {page: spec['name'] for page, spec in EXAMINER_SECTIONS.items()
+                      if page < EXAMINER_TOTAL_PAGES}
+
+SELF_ASSESSMENT_SECTIONS = {
+    1: {'name': "Patient Information", 'kind': 'self_patient_info'},
+    # 'scale' rescales a section's raw points (requirements 3.2 and 3.5);
+    # 'domain' names the examiner section covering the same domain, where the names differ
+    2: {'name': "Orientation - Time", 'domain': "Orientation to Time", 'kind': 'self_orientation_time',
+        'scored_items': ['year', 'month', 'date', 'day', 'season'], 'scale': 5 / 4},
+    3: {'name': "Orientation - Place", 'domain': "Orientation to Place", 'kind': 'self_orientation_place',
+        'scored_items': ['city', 'country', 'province'], 'scale': 5 / 3},
+    4: {'name': "Registration", 'kind': 'self_registration',
+        'scored_items': ['apple', 'table', 'coin']},
+    # Only one of the two tasks is given, so the section is worth 5 points either way
+    5: {'name': "Attention and Calculation", 'kind': 'self_attention',
+        'scored_items': [f"serial7_{i}" for i in range(1, 6)] + [f"dlrow_{i}" for i in range(1, 6)],
+        'max_points': 5},
+    6: {'name': "Recall", 'kind': 'self_recall',
+        'scored_items': ['apple', 'coin', 'table']},
+    7: {'name': "Language - Naming", 'domain': "Naming", 'kind': 'self_naming',
+        'scored_items': ['pencil', 'watch']},
+    8: {'name': "Cookie Test", 'kind': 'self_cookie_test'},
+    9: {'name': "Assessment Complete", 'kind': 'self_summary'}
+}
+
+
+def scored_items(spec):
+    """Item keys a section records in the scoring ledger."""
+    if spec['kind'] == 'items':
+        return [entry['key'] for entry in spec['items']]
+    return spec.get('scored_items', [])
+
+
+def section_domain(spec):
+    """Cognitive domain a section scores, named as in the examiner flow so both flows pool together."""
+    return spec.get('domain', spec['name'])
+
+
+# Exam type -> (partition value, sections, raw maximum)
+FLOWS = {
+    "With Examiner": ('examiner', EXAMINER_SECTIONS, EXAMINER_MAX_SCORE),
+    "Self Examination": ('self', SELF_ASSESSMENT_SECTIONS, SELF_ASSESSMENT_MAX_SCORE)
+}
+
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def domain_column(flow, section):
+    return f"{flow}__{_slug(section)}"
+
+
+def item_column(flow, section, item):
+    return f"{domain_column(flow, section)}__{item}"
@@ -0,0 +1,196 @@
+import wave
+
+import av
+import numpy as np
+import streamlit as st
+
+FRAME_SECONDS = 0.02
+# Silences shorter than this are part of normal articulation, not pauses
+MIN_PAUSE_SECONDS = 0.25
+# Frames this far above the noise floor count as speech
+SPEECH_MARGIN_DB = 12.0
+MIN_SPEECH_DB = -50.0
+WAV_CHUNK_FRAMES = 1 << 16
+
+
+def _wav_chunks(wav):
+    # 16-bit PCM (what st.audio_input produces) is read straight into NumPy, one chunk at a time
+    channels = wav.getnchannels()
+    while True:
+        data = wav.readframes(WAV_CHUNK_FRAMES)
+        if not data:
+            break
+        yield np.frombuffer(data, dtype='<i2').reshape(-1, channels).mean(axis=1, dtype=np.float32) / 32768.0
+
+
+def frame_to_mono(frame):
+    data = frame.to_ndarray()
+    channels = len(frame.layout.channels)
+    if not frame.format.is_planar:
+        data = data.reshape(-1, channels).T
+    data = data.astype(np.float32)
+    if frame.format.name.startswith('s16'):
+        data /= 32768.0
+    elif frame.format.name.startswith('s32'):
+        data /= 2147483648.0
+    return data.mean(axis=0)
+
+
+def _av_chunks(container, stream):
+    # Decoded frames are small (~20 ms); group them so each chunk is about as long as a WAV chunk
+    chunk, length = [], 0
+    for frame in container.decode(stream):
+        chunk.append(frame_to_mono(frame))
+        length += len(chunk[-1])
+        if length >= WAV_CHUNK_FRAMES:
+            yield np.concatenate(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield np.concatenate(chunk)
+
+
+def frame_energy_db(samples, sample_rate, frame_seconds=FRAME_SECONDS):
+    frame_length = int(sample_rate * frame_seconds)
+    n_frames = len(samples) // frame_length
+    frames = samples[:n_frames * frame_length].reshape(n_frames, frame_length)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _runs(mask):
+    # Start/end frame indices of each run of True values
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def voice_activity(energy_db, frame_seconds=FRAME_SECONDS, min_pause_seconds=MIN_PAUSE_SECONDS):
+    if len(energy_db) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor = np.percentile(energy_db, 10)
+    speech = energy_db > max(noise_floor + SPEECH_MARGIN_DB, MIN_SPEECH_DB)
+
+    # Bridge gaps too short to be pauses
+    starts, ends = _runs(~speech)
+    short = (ends - starts) * frame_seconds < min_pause_seconds
+    interior = (starts > 0) & (ends < len(speech))
+    fill = np.zeros(len(speech) + 1, dtype=np.int32)
+    np.add.at(fill, starts[short & interior], 1)
+    np.add.at(fill, ends[short & interior], -1)
+    return speech | (np.cumsum(fill)[:-1] > 0)
+
+
+def fluency_metrics(samples, sample_rate, frame_seconds=FRAME_SECONDS):
+    energy_db = frame_energy_db(samples, sample_rate, frame_seconds)
+    return metrics_from_energy(energy_db, len(samples) / sample_rate, frame_seconds)
+
+
+def metrics_from_energy(energy_db, total_seconds, frame_seconds=FRAME_SECONDS):
+    speech = voice_activity(energy_db, frame_seconds)
+    speech_seconds = float(speech.sum() * frame_seconds)
+
+    # Pauses are silences between speech, not the lead-in or trailing silence
+    starts, ends = _runs(~speech)
+    interior = (starts > 0) & (ends < len(speech))
+    pauses = (ends[interior] - starts[interior]) * frame_seconds
+    silence_seconds = float(pauses.sum())
+
+    metrics = {
+        'total_seconds': round(total_seconds, 2),
+        'speech_seconds': round(speech_seconds, 2),
+        'pause_count': int(len(pauses)),
+        'pause_seconds_total': round(silence_seconds, 2),
+        'speech_to_silence_ratio': round(speech_seconds / silence_seconds, 2) if silence_seconds else None
+    }
+    if len(pauses):
+        metrics.update({
+            'pause_seconds_mean': round(float(pauses.mean()), 2),
+            'pause_seconds_median': round(float(np.median(pauses)), 2),
+            'pause_seconds_p90': round(float(np.percentile(pauses, 90)), 2),
+            'pause_seconds_max': round(float(pauses.max()), 2)
+        })
+    return metrics
+
+
+class FrameEnergy:
+    """Frame energies of audio fed in chunks; only the energy vector and an unfinished frame are kept."""
+
+    def __init__(self, frame_seconds=FRAME_SECONDS):
+        self.frame_seconds = frame_seconds
+        self.sample_rate = None
+        self.sample_count = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._energy = []
+
+    def add(self, samples, sample_rate):
+        if self.sample_rate is None:
+            self.sample_rate = sample_rate
+        # Only whole analysis frames are scored; the remainder waits for the next chunk
+        frame_length = int(sample_rate * self.frame_seconds)
+        data = np.concatenate((self._pending, samples))
+        n_frames = len(data) // frame_length
+        self._energy.append(frame_energy_db(data[:n_frames * frame_length], sample_rate, self.frame_seconds))
+        self._pending = data[n_frames * frame_length:]
+        self.sample_count += len(samples)
+        if len(self._energy) >= 256:
+            # Live capture adds one 20 ms frame at a time; keep a few arrays rather than thousands
+            self._energy = [np.concatenate(self._energy)]
+
+    def seconds(self):
+        return self.sample_count / self.sample_rate if self.sample_rate else 0.0
+
+    def energy_db(self):
+        return np.concatenate(self._energy) if self._energy else np.zeros(0)
+
+    def metrics(self):
+        return metrics_from_energy(self.energy_db(), self.seconds(), self.frame_seconds)
+
+
+def _add_wav(source, energy):
+    with wave.open(source) as wav:
+        if wav.getsampwidth() != 2:
+            return False
+        sample_rate = wav.getframerate()
+        for chunk in _wav_chunks(wav):
+            energy.add(chunk, sample_rate)
+    return True
+
+
+def _add_av(source, energy):
+    with av.open(source) as container:
+        stream = container.streams.audio[0]
+        for chunk in _av_chunks(container, stream):
+            energy.add(chunk, stream.rate)
+
+
+def recording_energy(source):
+    """Frame energies of a path or file-like recording, decoded chunk by chunk so memory stays flat."""
+    energy = FrameEnergy()
+    decoded = False
+    try:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        decoded = _add_wav(source, energy)
+    except (wave.Error, EOFError):
+        pass
+    if not decoded:
+        energy = FrameEnergy()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        _add_av(source, energy)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return energy
+
+
+def analyze_recording(source):
+    return recording_energy(source).metrics()
+
+
+def session_fluency(upload):
+    # Analyse each distinct upload once per session
+    results = st.session_state.setdefault('fluency_results', {})
+    if upload.file_id not in results:
+        results[upload.file_id] = analyze_recording(upload)
+    st.session_state.setdefault('responses', {})['cookie_test_fluency'] = results[upload.file_id]
+    return results[upload.file_id]
@@ -0,0 +1,412 @@
+"""Where the patient is, for scoring the orientation-to-place answers and the local time.
+
+The location is looked up from the client's IP address. Streamlit only sees that address through a reverse
+proxy (nginx, a load balancer) that adds X-Forwarded-For or X-Real-Ip, and those headers are only read when
+MMSE_TRUSTED_PROXIES says how many such proxies there are. Without them every client is NO_CLIENT_IP: the
+session gets MMSE_CLINIC_LOCATION if it is set, otherwise the server's own location (right only when the
+server runs at the clinic), and the "Unknown" free-point fallback if even that cannot be found.
+"""
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+import streamlit as st
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+
+from ip_database import IPRangeDatabase
+from metrics import timed
+from timezones import timezone_at
+
+logger = logging.getLogger(__name__)
+
+# These locate the caller, i.e. this server
+LOCATION_SERVICES = [
+    'https://ipapi.co/json/',
+    'https://ip-api.com/json/',
+    'https://freegeoip.app/json/'
+]
+# The same providers' endpoints for a given client address
+CLIENT_IP_SERVICES = {
+    'https://ipapi.co/json/': 'https://ipapi.co/{ip}/json/',
+    'https://ip-api.com/json/': 'https://ip-api.com/json/{ip}',
+    'https://freegeoip.app/json/': 'https://freegeoip.app/json/{ip}'
+}
+
+UNKNOWN_LOCATION = {
+    'city': 'Unknown',
+    'country': 'Unknown',
+    'state': 'Unknown',
+    'latitude': 0,
+    'longitude': 0
+}
+
+# Optional offline IP-range index built with ip_database.py
+IP_DATABASE_PATH = os.environ.get('MMSE_IP_DATABASE')
+OFFLINE_ONLY = os.environ.get('MMSE_OFFLINE') == '1'
+# Reverse proxies in front of Streamlit that append to X-Forwarded-For. 0 ignores forwarding headers,
+# which any client can set to pick the location it is scored against.
+TRUSTED_PROXIES = int(os.environ.get('MMSE_TRUSTED_PROXIES', '0'))
+# What client_ip() returns when the request carries no usable client address
+NO_CLIENT_IP = 'local'
+
+
+def _configured_location(value):
+    # JSON object with any of the UNKNOWN_LOCATION keys, e.g. {"city": "Nairobi", "country": "Kenya", ...}
+    if not value:
+        return None
+    location = json.loads(value)
+    if not isinstance(location, dict) or not set(location) <= set(UNKNOWN_LOCATION):
+        raise ValueError(f"MMSE_CLINIC_LOCATION must be a JSON object with keys from {', '.join(UNKNOWN_LOCATION)}")
+    return {**UNKNOWN_LOCATION, **location}
+
+
+# Where the exams take place, for sessions whose client address is unknown
+CLINIC_LOCATION = _configured_location(os.environ.get('MMSE_CLINIC_LOCATION'))
+_warned_no_client_ip = False
+
+# Shared across sessions, keyed by client IP
+_location_cache = TTLCache(maxsize=1024, ttl=60 * 60)
+# Cache key of the server's own location, the only answer providers give without a public client IP
+SERVER_LOCATION = 'server'
+_cache_lock = threading.Lock()
+_stats = {'session_hits': 0, 'cache_hits': 0, 'misses': 0}
+
+# Longest a page waits on a prefetch started at the welcome screen (seconds)
+PREFETCH_WAIT = 5
+# Longest a lookup waits for any provider, and for each HTTP call within it (seconds)
+LOOKUP_TIMEOUT = 5
+REQUEST_TIMEOUT = 3
+# A provider answering slower than this counts as failing, even when the answer is right
+SLOW_RESPONSE = 1.5
+
+
+class CircuitBreaker:
+    """Skips a provider after repeated failures until reset_timeout has passed."""
+
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                # Let a single request through to probe the provider
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+def _make_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(LOCATION_SERVICES), pool_maxsize=16)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_http = _make_http_session()
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='location-prefetch')
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(service):
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker()
+        return _breakers[service]
+
+
+def query_service(service, timeout=REQUEST_TIMEOUT):
+    with timed('http_request', host=urlsplit(service).netloc):
+        response = _http.get(service, timeout=timeout)
+    if response.status_code != 200:
+        return None
+    data = response.json()
+
+    # Handle different API response formats
+    if 'city' not in data:
+        return None
+    return {
+        'city': data.get('city', ''),
+        'country': data.get('country_name', data.get('country', '')),
+        'state': data.get('region', data.get('region_name', '')),
+        'latitude': data.get('latitude', data.get('lat', 0)),
+        'longitude': data.get('longitude', data.get('lon', 0))
+    }
+
+
+def _query_with_breaker(breaker, url, timeout):
+    # Reports to the breaker even after the lookup that started it has returned
+    started = time.monotonic()
+    try:
+        location = query_service(url, timeout)
+    except Exception:
+        breaker.record_failure()
+        raise
+    if location is None or time.monotonic() - started > SLOW_RESPONSE:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return location
+
+
+def _release_if_cancelled(breaker, future):
+    if future.cancelled():
+        breaker.release()
+
+
+def get_location_from_ip(services=None, timeout=LOOKUP_TIMEOUT, ip=None, request_timeout=REQUEST_TIMEOUT):
+    # Query every healthy provider at once and keep the first valid answer
+    services = LOCATION_SERVICES if services is None else services
+    calls = []
+    for service in services:
+        url = service
+        if ip is not None:
+            if service not in CLIENT_IP_SERVICES:
+                # Would locate the server, not the client
+                continue
+            url = CLIENT_IP_SERVICES[service].format(ip=ip)
+        breaker = breaker_for(service)
+        if breaker.allow():
+            calls.append((breaker, url))
+    if not calls:
+        return dict(UNKNOWN_LOCATION)
+
+    # One thread per provider, owned by this lookup: calls it abandons finish on their own
+    # (bounded by request_timeout) without holding up anyone else's lookup
+    executor = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix='geolocation')
+    futures = []
+    for breaker, url in calls:
+        future = executor.submit(_query_with_breaker, breaker, url, min(request_timeout, timeout))
+        future.add_done_callback(partial(_release_if_cancelled, breaker))
+        futures.append(future)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            if future.exception() is None and future.result() is not None:
+                return future.result()
+    except FuturesTimeout:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # Fallback to default location if all services fail
+    return dict(UNKNOWN_LOCATION)
+
+
+def provider_status():
+    with _breakers_lock:
+        return {service: {'state': breaker.state, 'failures': breaker.failures}
+                for service, breaker in _breakers.items()}
+
+
+def is_public_ip(ip):
+    try:
+        return ipaddress.ip_address(str(ip).strip()).is_global
+    except ValueError:
+        return False
+
+
+def _server_location():
+    with _cache_lock:
+        location = _location_cache.get(SERVER_LOCATION)
+    if location is None:
+        location = get_location_from_ip()
+        if location['city'] != 'Unknown':
+            with _cache_lock:
+                _location_cache[SERVER_LOCATION] = location
+    return location
+
+
+def network_backend(ip):
+    if is_public_ip(ip):
+        location = get_location_from_ip(ip=str(ip).strip())
+    else:
+        # Local runs and private proxy addresses: the best answer is the server's own location
+        location = _server_location()
+    if location['city'] == 'Unknown':
+        return None
+    return location
+
+
+_backends = None
+_backends_lock = threading.Lock()
+
+
+def _default_backends():
+    backends = []
+    if IP_DATABASE_PATH:
+        backends.append(IPRangeDatabase(IP_DATABASE_PATH).lookup)
+    if not OFFLINE_ONLY:
+        backends.append(network_backend)
+    return backends
+
+
+def location_backends():
+    global _backends
+    with _backends_lock:
+        if _backends is None:
+            _backends = _default_backends()
+        return _backends
+
+
+def set_location_backends(backends):
+    """Replace the lookup chain; each backend takes a client IP and returns a location dict or None."""
+    global _backends
+    with _backends_lock:
+        _backends = list(backends)
+
+
+def _no_client_location():
+    global _warned_no_client_ip
+    if CLINIC_LOCATION is not None:
+        return dict(CLINIC_LOCATION)
+    if not _warned_no_client_ip:
+        _warned_no_client_ip = True
+        logger.warning("No client IP address (set MMSE_TRUSTED_PROXIES behind a reverse proxy) and no "
+                       "MMSE_CLINIC_LOCATION; locating patients at the server's own location")
+    return None
+
+
+def lookup_location(ip):
+    if ip == NO_CLIENT_IP:
+        location = _no_client_location()
+        if location is not None:
+            return location
+    for backend in location_backends():
+        try:
+            location = backend(ip)
+        except Exception:
+            continue
+        if location:
+            return location
+    return dict(UNKNOWN_LOCATION)
+
+
+def client_ip(trusted_proxies=None):
+    trusted_proxies = TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    if not trusted_proxies:
+        return NO_CLIENT_IP
+    try:
+        headers = st.context.headers
+    except Exception:
+        return NO_CLIENT_IP
+    # Each trusted proxy appends the address it received the request from; anything further left is
+    # whatever the client sent
+    forwarded = [entry.strip() for entry in headers.get('X-Forwarded-For', '').split(',') if entry.strip()]
+    if forwarded:
+        # Fewer entries than proxies means a request that bypassed some of them
+        return forwarded[-trusted_proxies] if len(forwarded) >= trusted_proxies else NO_CLIENT_IP
+    # A single proxy that sets X-Real-Ip to the peer address instead
+    return headers.get('X-Real-Ip') or NO_CLIENT_IP
+
+
+def cached_lookup(key):
+    with _cache_lock:
+        location_data = _location_cache.get(key)
+        if location_data is not None:
+            _stats['cache_hits'] += 1
+        else:
+            _stats['misses'] += 1
+
+    if location_data is None:
+        location_data = lookup_location(key)
+        # Only share real answers; a failed lookup is retried by the next session
+        if location_data['city'] != 'Unknown':
+            with _cache_lock:
+                _location_cache[key] = location_data
+    return location_data
+
+
+def _prefetch(key):
+    location_data = cached_lookup(key)
+    # Warm the timezone cache so page 2 only does a dictionary lookup
+    timezone_at(location_data['latitude'], location_data['longitude'])
+    return location_data
+
+
+def prefetch_location():
+    """Start resolving the session's location in the background."""
+    if 'location_data' in st.session_state or 'location_future' in st.session_state:
+        return
+    st.session_state.location_future = _prefetch_executor.submit(_prefetch, client_ip())
+
+
+def resolve_location(wait=PREFETCH_WAIT):
+    """Location for the current session, looked up at most once per session/client IP."""
+    if 'location_data' in st.session_state:
+        with _cache_lock:
+            _stats['session_hits'] += 1
+        return st.session_state.location_data
+
+    location_data = None
+    future = st.session_state.get('location_future')
+    if future is not None:
+        try:
+            location_data = future.result(timeout=wait)
+        except FuturesTimeout:
+            # Still resolving: render with the fallback and pick up the answer on a later rerun
+            return dict(UNKNOWN_LOCATION)
+        except Exception:
+            location_data = None
+        del st.session_state['location_future']
+
+    if location_data is None:
+        location_data = cached_lookup(client_ip())
+
+    st.session_state.location_data = dict(location_data)
+    return st.session_state.location_data
+
+
+def cache_stats():
+    with _cache_lock:
+        stats = dict(_stats)
+        stats['cached_clients'] = len(_location_cache)
+    return stats
+
+
+def clear_location_cache():
+    with _cache_lock:
+        _location_cache.clear()
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,96 @@
+import csv
+import ipaddress
+import json
+import os
+import sys
+
+import numpy as np
+
+# Columns expected in the source CSV (start/end may be dotted quads or integers)
+CSV_FIELDS = ['start_ip', 'end_ip', 'city', 'country', 'state', 'latitude', 'longitude']
+
+
+def ip_to_int(ip):
+    try:
+        address = ipaddress.ip_address(str(ip).strip())
+    except ValueError:
+        return None
+    if address.version != 4:
+        return None
+    return int(address)
+
+
+def _parse_ip(value):
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    return ip_to_int(value)
+
+
+def build_ip_database(csv_path, out_dir):
+    """Convert a CSV of non-overlapping IPv4 ranges into the on-disk index read by IPRangeDatabase."""
+    ranges = []
+    locations = []
+    location_ids = {}
+
+    with open(csv_path, newline='') as f:
+        for row in csv.DictReader(f, fieldnames=CSV_FIELDS):
+            start, end = _parse_ip(row['start_ip']), _parse_ip(row['end_ip'])
+            if start is None or end is None:
+                # Header line or IPv6 range
+                continue
+            location = {
+                'city': row['city'] or '',
+                'country': row['country'] or '',
+                'state': row['state'] or '',
+                'latitude': float(row['latitude'] or 0),
+                'longitude': float(row['longitude'] or 0)
+            }
+            key = tuple(location.values())
+            if key not in location_ids:
+                location_ids[key] = len(locations)
+                locations.append(location)
+            ranges.append((start, end, location_ids[key]))
+
+    ranges.sort()
+    table = np.array(ranges, dtype=np.uint32).reshape(-1, 3)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, 'starts.npy'), np.ascontiguousarray(table[:, 0]))
+    np.save(os.path.join(out_dir, 'ends.npy'), np.ascontiguousarray(table[:, 1]))
+    np.save(os.path.join(out_dir, 'location_ids.npy'), np.ascontiguousarray(table[:, 2]))
+    with open(os.path.join(out_dir, 'locations.json'), 'w') as f:
+        json.dump(locations, f)
+    return len(ranges)
+
+
+class IPRangeDatabase:
+    """Sorted IPv4 interval index, memory-mapped so worker processes share the page cache."""
+
+    def __init__(self, path):
+        self.path = path
+        self.starts = np.load(os.path.join(path, 'starts.npy'), mmap_mode='r')
+        self.ends = np.load(os.path.join(path, 'ends.npy'), mmap_mode='r')
+        self.location_ids = np.load(os.path.join(path, 'location_ids.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'locations.json')) as f:
+            self.locations = json.load(f)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, ip):
+        value = ip_to_int(ip)
+        if value is None:
+            return None
+        idx = int(np.searchsorted(self.starts, np.uint32(value), side='right')) - 1
+        if idx < 0 or value > self.ends[idx]:
+            return None
+        return dict(self.locations[self.location_ids[idx]])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python ip_database.py <ranges.csv> <output_dir>")
+        sys.exit(1)
+    count = build_ip_database(sys.argv[1], sys.argv[2])
+    print(f"Indexed {count} ranges into {sys.argv[2]}")
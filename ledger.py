@@ -0,0 +1,45 @@
+import time
+
+import streamlit as st
+
+
+def empty_ledger():
+    # events: append-only [section, item, points, recorded_at]
+    # items/sections: materialized view of the latest result per item and per section
+    return {'events': [], 'items': {}, 'sections': {}}
+
+
+def init_ledger():
+    if 'ledger' not in st.session_state:
+        st.session_state.ledger = empty_ledger()
+
+
+def record_section(section, item_points, section_points=None):
+    """Record a section's per-item results, replacing any earlier attempt at the same section.
+
+    section_points overrides the plain item sum for sections that are rescaled.
+    """
+    ledger = st.session_state.ledger
+    recorded_at = time.time()
+    for item, points in item_points.items():
+        ledger['events'].append([section, item, points, recorded_at])
+
+    if section_points is None:
+        section_points = sum(item_points.values())
+    previous = ledger['sections'].get(section, 0)
+    ledger['items'][section] = dict(item_points)
+    ledger['sections'][section] = section_points
+
+    # Only the delta touches the running total, so revisits never double-count
+    st.session_state.score += section_points - previous
+
+
+def section_subtotals():
+    return dict(st.session_state.ledger['sections'])
+
+
+def render_subtotals():
+    subtotals = section_subtotals()
+    if subtotals:
+        st.write("Score by domain:")
+        st.table({'Domain': list(subtotals), 'Points': list(subtotals.values())})
@@ -0,0 +1,140 @@
+import os
+import queue
+import tempfile
+import threading
+import wave
+
+import numpy as np
+import streamlit as st
+from streamlit_webrtc import WebRtcMode, webrtc_streamer
+
+from fluency import FrameEnergy, frame_to_mono
+from recordings import RECORDINGS_DIR, adopt_recording
+
+# ~10 s of 20 ms WebRTC frames; beyond that frames are dropped rather than stalling the call
+QUEUE_FRAMES = 500
+FINISH_TIMEOUT = 10
+
+
+class LiveRecording:
+    """Receives WebRTC audio frames and writes them to disk on a background consumer thread."""
+
+    def __init__(self, directory=RECORDINGS_DIR, max_queue=QUEUE_FRAMES):
+        self.directory = directory
+        self.tmp_path = None
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.sample_rate = None
+        self.samples_written = 0
+        self.path = None
+        self._wav = None
+        self._energy = FrameEnergy()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._done = threading.Event()
+        self._consumer = None
+
+    def _start(self):
+        # File and consumer thread only exist once audio actually arrives
+        with self._lock:
+            if self._consumer is None:
+                os.makedirs(self.directory, exist_ok=True)
+                fd, self.tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".live.part")
+                os.close(fd)
+                self._consumer = threading.Thread(target=self._consume, name='live-capture', daemon=True)
+                self._consumer.start()
+
+    def on_frame(self, frame):
+        # Runs on the WebRTC worker thread; must never block
+        if not self._closed:
+            if self._consumer is None:
+                self._start()
+            try:
+                self.frames.put_nowait((frame.sample_rate, frame_to_mono(frame)))
+            except queue.Full:
+                self.dropped += 1
+        return frame
+
+    def _consume(self):
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None:
+                    break
+                self._append(*item)
+        finally:
+            if self._wav is not None:
+                self._wav.close()
+            self._done.set()
+
+    def _append(self, sample_rate, samples):
+        if self._wav is None:
+            self.sample_rate = sample_rate
+            self._wav = wave.open(self.tmp_path, 'wb')
+            self._wav.setnchannels(1)
+            self._wav.setsampwidth(2)
+            self._wav.setframerate(sample_rate)
+        pcm = np.clip(samples * 32768.0, -32768, 32767).astype('<i2')
+        self._wav.writeframes(pcm.tobytes())
+        with self._lock:
+            self._energy.add(samples, sample_rate)
+            self.samples_written += len(samples)
+
+    @property
+    def started(self):
+        return self._consumer is not None
+
+    def seconds(self):
+        with self._lock:
+            return self.samples_written / self.sample_rate if self.sample_rate else 0.0
+
+    def metrics(self):
+        with self._lock:
+            return self._energy.metrics()
+
+    def finish(self, patient_id):
+        """Drain the queue, close the WAV and store it; returns the saved path or None if nothing was captured."""
+        if not self._closed:
+            self._closed = True
+            if self._consumer is None:
+                return None
+            self.frames.put(None)
+            self._done.wait(FINISH_TIMEOUT)
+            if self.samples_written:
+                self.path = adopt_recording(self.tmp_path, patient_id)
+            elif os.path.exists(self.tmp_path):
+                os.unlink(self.tmp_path)
+        return self.path
+
+
+def render_live_capture(patient_id):
+    """Stream the microphone over WebRTC; returns the saved recording path once capture stops."""
+    live = st.session_state.get('live_recording')
+    if live is None:
+        live = st.session_state.live_recording = LiveRecording()
+
+    ctx = webrtc_streamer(
+        key="cookie-test-live",
+        mode=WebRtcMode.SENDONLY,
+        audio_frame_callback=live.on_frame,
+        media_stream_constraints={"audio": True, "video": False}
+    )
+
+    if ctx.state.playing:
+        st.caption(f"Recording… {live.seconds():.0f}s captured")
+        return st.session_state.get('live_recording_path')
+
+    if live.started:
+        path = live.finish(patient_id)
+        if path:
+            st.session_state.live_recording_path = path
+            st.session_state.live_recording_fluency = live.metrics()
+        if live.dropped:
+            st.warning(f"{live.dropped} audio frames were dropped during capture")
+        # A fresh recorder for the next take
+        st.session_state.live_recording = LiveRecording()
+
+    path = st.session_state.get('live_recording_path')
+    if path:
+        st.session_state.setdefault('responses', {})['cookie_test_fluency'] = st.session_state.live_recording_fluency
+    return path
@@ -0,0 +1,192 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get('MMSE_METRICS_DIR', os.path.join("data", "metrics"))
+# Shows the "Performance metrics" toggle in the sidebar
+DEBUG_PANEL = os.environ.get('MMSE_DEBUG_METRICS') == '1'
+# Upper bounds (seconds) of the histogram buckets; one more bucket catches anything slower
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PUBLISH_INTERVAL = 10
+# Snapshots of processes that stopped publishing this long ago are left out, and deleted
+STALE_AFTER = 5 * 60
+
+# (name, sorted label items) -> {'counts', 'sum', 'count'}
+_series = {}
+_lock = threading.Lock()
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def observe(name, seconds, **labels):
+    key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+    bucket = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = {'counts': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+        series['counts'][bucket] += 1
+        series['sum'] += seconds
+        series['count'] += 1
+
+
+@contextmanager
+def timed(name, **labels):
+    """Record how long the block took, including when it exits with an exception (e.g. st.rerun)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def snapshot():
+    with _lock:
+        return [{'name': name, 'labels': dict(labels), 'counts': list(series['counts']),
+                 'sum': series['sum'], 'count': series['count']}
+                for (name, labels), series in _series.items()]
+
+
+def reset():
+    with _lock:
+        _series.clear()
+
+
+def _snapshot_path():
+    return os.path.join(METRICS_DIR, f"{socket.gethostname()}-{os.getpid()}.json")
+
+
+def publish():
+    """Write this process's histograms where other processes (the Flask app) can read them."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({'published_at': time.time(), 'series': snapshot()}, f)
+        os.replace(tmp_path, _snapshot_path())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _publish_loop():
+    while True:
+        time.sleep(PUBLISH_INTERVAL)
+        try:
+            publish()
+        except Exception:
+            # A full disk or a removed directory must not stop publishing for good
+            logger.warning("Could not publish metrics to %s", METRICS_DIR, exc_info=True)
+
+
+def start_publisher():
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = threading.Thread(target=_publish_loop, name='metrics-publisher', daemon=True)
+            _publisher.start()
+            atexit.register(publish)
+
+
+def collect():
+    """This process's series merged with the fresh snapshots of every other process."""
+    merged = {}
+    sources = [snapshot()]
+    if os.path.isdir(METRICS_DIR):
+        own = os.path.basename(_snapshot_path())
+        for entry in os.scandir(METRICS_DIR):
+            if entry.name == own or not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as f:
+                    published = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if time.time() - published['published_at'] < STALE_AFTER:
+                sources.append(published['series'])
+                continue
+            # Left by a process that has exited (each restart publishes under a new PID)
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+    for series_list in sources:
+        for series in series_list:
+            key = (series['name'], tuple(sorted(series['labels'].items())))
+            if key not in merged:
+                merged[key] = {**series, 'counts': list(series['counts'])}
+                continue
+            target = merged[key]
+            target['counts'] = [a + b for a, b in zip(target['counts'], series['counts'])]
+            target['sum'] += series['sum']
+            target['count'] += series['count']
+    return sorted(merged.values(), key=lambda s: (s['name'], sorted(s['labels'].items())))
+
+
+def quantile(series, q):
+    """Estimate from the buckets, interpolating linearly inside the bucket the quantile falls in."""
+    if not series['count']:
+        return None
+    rank = q * series['count']
+    seen = 0
+    for i, count in enumerate(series['counts']):
+        if count and seen + count >= rank:
+            if i == len(BUCKETS):
+                return BUCKETS[-1]
+            lower = BUCKETS[i - 1] if i else 0.0
+            return lower + (BUCKETS[i] - lower) * (rank - seen) / count
+        seen += count
+    return BUCKETS[-1]
+
+
+def summary(series_list=None):
+    """One row per series: call count, total and mean time, estimated percentiles (ms)."""
+    rows = []
+    for series in collect() if series_list is None else series_list:
+        row = {'name': series['name'], **series['labels'], 'count': series['count'],
+               'total_s': round(series['sum'], 3),
+               'mean_ms': round(series['sum'] / series['count'] * 1000, 2) if series['count'] else None}
+        for q in (0.5, 0.9, 0.99):
+            value = quantile(series, q)
+            row[f"p{round(q * 100)}_ms"] = None if value is None else round(value * 1000, 2)
+        rows.append(row)
+    return rows
+
+
+def prometheus_text(series_list=None):
+    """Prometheus text exposition of the histograms (seconds)."""
+    lines = []
+    for series in collect() if series_list is None else series_list:
+        name = f"mmse_{series['name']}_seconds"
+        labels = ','.join(f'{label}="{value}"' for label, value in sorted(series['labels'].items()))
+        cumulative = 0
+        for bound, count in zip([*BUCKETS, '+Inf'], series['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {series['sum']}")
+        lines.append(f"{name}_count{{{labels}}} {series['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics_panel():
+    rows = summary(snapshot())
+    if not rows:
+        st.caption("No timings recorded yet.")
+        return
+    st.caption("Timings recorded by this server process since it started")
+    st.dataframe(rows, hide_index=True)
+    if st.button("Reset timings"):
+        reset()
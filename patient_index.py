@@ -0,0 +1,142 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import streamlit as st
+
+from flows import FLOWS
+from metrics import timed
+from scoring import normalize_score
+
+PATIENT_DB = os.environ.get('MMSE_PATIENT_DB', os.path.join("data", "patients.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS visits (
+    session_id TEXT PRIMARY KEY,
+    patient_key TEXT NOT NULL,
+    patient_name TEXT NOT NULL,
+    exam_type TEXT NOT NULL,
+    exam_date TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    score INTEGER NOT NULL,
+    normalized_score INTEGER NOT NULL,
+    domains TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS visits_patient ON visits (patient_key, exam_date, completed_at);
+"""
+
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def patient_key(name):
+    """Normalized identifier: accents, case, punctuation and spacing don't split a patient's history."""
+    name = str(name)
+    # "Smith, John" is the same patient as "John Smith"
+    if name.count(',') == 1:
+        last, first = name.split(',')
+        name = f"{first} {last}"
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(re.sub(r"[^\w\s]", ' ', name.casefold()).split())
+
+
+def connection(path=PATIENT_DB):
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            _conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            _conn.executescript(SCHEMA)
+        return _conn
+
+
+def save_visit(visit):
+    """Insert or, for a reviewed exam, replace the visit with the same session_id."""
+    conn = connection()
+    with _conn_lock, timed('file_io', op='visit_write'), conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO visits (session_id, patient_key, patient_name, exam_type, exam_date, "
+            "completed_at, score, normalized_score, domains) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (visit['session_id'], patient_key(visit['patient_name']), visit['patient_name'], visit['exam_type'],
+             visit['exam_date'], visit['completed_at'], visit['score'], visit['normalized_score'],
+             json.dumps(visit['domains'], separators=(',', ':')))
+        )
+
+
+def patient_history(name, exclude_session=None):
+    """Every recorded visit for the patient, oldest first; served from the (patient_key, date) index."""
+    conn = connection()
+    with _conn_lock, timed('file_io', op='visit_read'):
+        rows = conn.execute(
+            "SELECT session_id, patient_name, exam_type, exam_date, completed_at, score, normalized_score, domains "
+            "FROM visits WHERE patient_key = ? ORDER BY exam_date, completed_at",
+            (patient_key(name),)
+        ).fetchall()
+    return [
+        {'session_id': row[0], 'patient_name': row[1], 'exam_type': row[2], 'exam_date': row[3],
+         'completed_at': row[4], 'score': row[5], 'normalized_score': row[6], 'domains': json.loads(row[7])}
+        for row in rows if row[0] != exclude_session
+    ]
+
+
+def change_since_baseline(history):
+    """Normalized-score change from the first visit, plus per-domain changes against the first visit of the same exam type."""
+    if not history:
+        return None
+    latest = history[-1]
+    baseline = history[0]
+    same_type = next(visit for visit in history if visit['exam_type'] == latest['exam_type'])
+    return {
+        'baseline_date': baseline['exam_date'],
+        'score_change': latest['normalized_score'] - baseline['normalized_score'],
+        'domain_changes': {domain: points - same_type['domains'].get(domain, 0)
+                           for domain, points in latest['domains'].items()}
+    }
+
+
+def record_visit():
+    """Index the finished exam under its patient; re-indexed only if the result changed after a review."""
+    patient_name = st.session_state.responses.get('patient_name')
+    if not patient_name or 'session_id' not in st.session_state:
+        return
+    _, _, max_score = FLOWS[st.session_state.exam_type]
+    visit = {
+        'session_id': st.session_state.session_id,
+        'patient_name': patient_name,
+        'exam_type': st.session_state.exam_type,
+        'exam_date': str(st.session_state.responses.get('exam_date') or time.strftime('%Y-%m-%d')),
+        'completed_at': time.time(),
+        'score': st.session_state.score,
+        'normalized_score': normalize_score(st.session_state.score, max_score),
+        'domains': st.session_state.ledger['sections']
+    }
+    fingerprint = json.dumps([visit['patient_name'], visit['exam_date'], visit['score'], visit['domains']])
+    if st.session_state.get('indexed_state') == fingerprint:
+        return
+    st.session_state.indexed_state = fingerprint
+    save_visit(visit)
+
+
+def render_prior_visits(patient_name):
+    history = patient_history(patient_name, exclude_session=st.session_state.get('session_id'))
+    if not history:
+        st.caption("No previous assessments on record for this patient.")
+        return
+    st.write(f"Previous assessments ({len(history)}):")
+    st.table({
+        'Date': [visit['exam_date'] for visit in history],
+        'Type': [visit['exam_type'] for visit in history],
+        'Score (out of 30)': [visit['normalized_score'] for visit in history]
+    })
+    change = change_since_baseline(history)
+    if len(history) > 1:
+        st.caption(f"Change since baseline ({change['baseline_date']}): {change['score_change']:+d} points")
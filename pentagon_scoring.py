@@ -0,0 +1,242 @@
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+from process_pool import spawn_pool
+
+# Drawings are analysed at this size (longest side, px); pen strokes stay a few pixels wide
+WORK_SIZE = 256
+# Broken strokes up to this many pixels are closed before looking for enclosed regions
+GAP_CLOSE = 3
+# Regions smaller than this fraction of the image are specks, not parts of the figure
+MIN_REGION_FRACTION = 0.002
+# Hull vertices whose triangle with their neighbours covers less than this fraction of
+# the polygon area are wobble along an edge, not corners
+CORNER_AREA_FRACTION = 0.03
+IMAGE_TYPES = ('.png', '.jpg', '.jpeg')
+
+
+def load_drawing(source, size=WORK_SIZE):
+    """Grayscale drawing with uneven lighting flattened, downscaled to about size."""
+    with Image.open(source) as image:
+        # JPEGs decode straight to a reduced size, which keeps phone photos cheap
+        image.draft('L', (size * 4, size * 4))
+        gray = np.asarray(ImageOps.exif_transpose(image).convert('L'))
+    # Min-pooling keeps every stroke, however thin, where averaging would fade it out
+    factor = -(-max(gray.shape) // size)
+    if factor > 1:
+        h, w = gray.shape[0] // factor * factor, gray.shape[1] // factor * factor
+        gray = gray[:h, :w].reshape(h // factor, factor, w // factor, factor).min(axis=(1, 3))
+    # Dividing by a heavy blur removes shadows and paper tint from photos
+    background = Image.fromarray(gray).filter(ImageFilter.GaussianBlur(size / 16))
+    background = np.maximum(np.asarray(background, dtype=np.float32), 1)
+    return np.clip(gray / background * 255, 0, 255).astype(np.uint8)
+
+
+def otsu_threshold(gray):
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * np.arange(256))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean[-1] * weight - mean * weight[-1]) ** 2 / (weight * (weight[-1] - weight))
+    return int(np.nanargmax(between))
+
+
+def binarize(gray):
+    """Ink mask; a blank page has none."""
+    if int(gray.max()) - int(gray.min()) < 64:
+        return np.zeros(gray.shape, dtype=bool)
+    ink = gray <= otsu_threshold(gray)
+    closed = Image.fromarray(ink.astype(np.uint8) * 255).filter(ImageFilter.MaxFilter(GAP_CLOSE))
+    return np.asarray(closed) > 0
+
+
+def label_regions(mask):
+    """4-connected component labels of mask (0 outside it) by min-label propagation."""
+    h, w = mask.shape
+    outside = h * w
+    index = np.arange(h * w, dtype=np.int32).reshape(h, w)
+    # Start from horizontal runs, so propagation only has to merge runs vertically
+    run_start = mask & ~np.pad(mask, ((0, 0), (1, 0)))[:, :-1]
+    labels = np.maximum.accumulate(np.where(run_start, index, 0), axis=1)
+    labels[~mask] = outside
+    while True:
+        new = labels.copy()
+        np.minimum(new[1:], labels[:-1], out=new[1:])
+        np.minimum(new[:-1], labels[1:], out=new[:-1])
+        np.minimum(new[:, 1:], labels[:, :-1], out=new[:, 1:])
+        np.minimum(new[:, :-1], labels[:, 1:], out=new[:, :-1])
+        new[~mask] = outside
+        # Pointer jumping: follow each label to its own label, so long regions converge in few passes
+        flat = new.ravel()
+        inside = flat < outside
+        flat[inside] = flat[flat[inside]]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    return np.where(mask, labels + 1, 0)
+
+
+def _cross(u, v):
+    return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+
+def convex_hull(mask):
+    """Hull vertices (x, y) of the mask, counter-clockwise; only row extremes can be hull vertices."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    left = mask[rows].argmax(axis=1)
+    right = mask.shape[1] - 1 - mask[rows, ::-1].argmax(axis=1)
+    points = np.unique(np.concatenate([np.stack([left, rows], 1), np.stack([right, rows], 1)]), axis=0)
+    if len(points) < 3:
+        return points.astype(np.float64)
+    points = points.astype(np.float64)
+    return np.concatenate([_convex_chain(points), _convex_chain(points[::-1])])
+
+
+def _convex_chain(points):
+    """One half of Andrew's monotone chain over sorted points, without its last point."""
+    # A point that does not turn left between its neighbours is never a hull vertex,
+    # so every such point is dropped at once, pass after pass, until only hull vertices are left
+    while len(points) > 2:
+        straight_or_right = _cross(points[1:-1] - points[:-2], points[2:] - points[:-2]) <= 0
+        if not straight_or_right.any():
+            break
+        points = points[np.concatenate(([True], ~straight_or_right, [True]))]
+    return points[:-1]
+
+
+def polygon_area(vertices):
+    x, y = vertices[:, 0], vertices[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def _corner_areas(vertices):
+    prev, nxt = np.roll(vertices, 1, axis=0), np.roll(vertices, -1, axis=0)
+    return 0.5 * np.abs(_cross(vertices - prev, nxt - prev))
+
+
+def simplify_polygon(vertices):
+    """Drop edge wobble (Visvalingam-Whyatt); returns the corners and how clearly they stood out (0-1)."""
+    area = polygon_area(vertices)
+    if area == 0:
+        return vertices, 0.0
+    removed = 0.0
+    # One vertex per pass: dropping a vertex changes its neighbours' areas, so the order matters
+    while len(vertices) > 3:
+        corners = _corner_areas(vertices) / area
+        weakest = int(corners.argmin())
+        if corners[weakest] >= CORNER_AREA_FRACTION:
+            break
+        removed = max(removed, corners[weakest])
+        vertices = np.delete(vertices, weakest, axis=0)
+    kept = _corner_areas(vertices).min() / area
+    # 1 when both the weakest corner and the strongest wobble are far (4x) from the cutoff,
+    # 0 when either sits right on it
+    margin = np.log(kept / CORNER_AREA_FRACTION)
+    if removed:
+        margin = min(margin, np.log(CORNER_AREA_FRACTION / removed))
+    return vertices, float(np.clip(margin / np.log(4), 0, 1))
+
+
+def clip_polygon(subject, clipper):
+    """Intersection of two convex polygons with the same winding (Sutherland-Hodgman)."""
+    output = np.asarray(subject, dtype=np.float64)
+    for a, b in zip(clipper, np.roll(clipper, -1, axis=0)):
+        if not len(output):
+            break
+        edge = b - a
+        # Each polygon edge p -> q adds its crossing of the clip line (if any), then q if it is inside
+        p, q = np.roll(output, 1, axis=0), output
+        q_in = _cross(edge, q - a) >= 0
+        p_in = np.roll(q_in, 1)
+        crosses = p_in != q_in
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Only used where the edge crosses, and so is never parallel to the clip line
+            t = _cross(edge, a - p) / _cross(edge, q - p)
+            points = np.stack([p + t[:, None] * (q - p), q], axis=1)
+        output = points[np.stack([crosses, q_in], axis=1)]
+    return output
+
+
+def _shape(mask):
+    hull = convex_hull(mask)
+    corners, clarity = simplify_polygon(hull)
+    hull_area = polygon_area(hull)
+    # Pen strokes inside the hull aren't counted, so a clean convex shape sits a little below 1
+    solidity = mask.sum() / hull_area if hull_area else 0.0
+    return {'corners': corners, 'sides': len(corners), 'clarity': clarity, 'solidity': float(min(solidity, 1.0))}
+
+
+def _result(score, confidence, reason, **details):
+    return {'score': score, 'confidence': round(float(confidence), 2), 'reason': reason, **details}
+
+
+def analyze_drawing(source):
+    """Suggested copying score (0/1) and confidence for a drawing of two intersecting pentagons."""
+    ink = binarize(load_drawing(source))
+    if not ink.any():
+        return _result(0, 0.9, "No drawing found")
+
+    labels = label_regions(~ink)
+    areas = np.bincount(labels.ravel(), minlength=labels.size + 1)
+    areas[0] = 0
+    # Anything connected to the edge of the page is outside the figure
+    edge = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+    areas[edge] = 0
+    regions = np.flatnonzero(areas >= MIN_REGION_FRACTION * labels.size)
+    regions = regions[np.argsort(areas[regions])[::-1]]
+    if len(regions) < 3:
+        return _result(0, 0.8 if len(regions) < 2 else 0.6,
+                       f"Found {len(regions)} enclosed region(s); two intersecting figures enclose 3",
+                       regions=int(len(regions)))
+
+    # Stray extra loops make the reading less certain
+    extra = areas[regions[3:]].sum() / areas[regions[:3]].sum()
+    masks = [labels == region for region in regions[:3]]
+
+    # The intersection is the region that completes both figures into convex shapes
+    best = None
+    for middle in range(3):
+        a, b = [masks[i] for i in range(3) if i != middle]
+        figures = [_shape(a | masks[middle]), _shape(b | masks[middle])]
+        fit = min(figure['solidity'] for figure in figures)
+        if best is None or fit > best[0]:
+            best = (fit, figures, masks[middle])
+    _, figures, middle = best
+
+    # Sides are counted on the overlap of the two fitted figures: the pixel region itself
+    # loses its sharpest corners under the crossing strokes
+    overlap = clip_polygon(figures[0]['corners'], figures[1]['corners'])
+    if len(overlap) < 3:
+        return _result(0, 0.6, "The two figures do not overlap", regions=int(len(regions)))
+    overlap_corners, overlap_clarity = simplify_polygon(overlap)
+    solidity = min(min(figure['solidity'] for figure in figures), _shape(middle)['solidity'])
+    clarity = min(figures[0]['clarity'], figures[1]['clarity'], overlap_clarity)
+    confidence = clarity * min(1.0, solidity / 0.85) * (1 - min(extra, 0.5))
+    details = {'figure_sides': [figure['sides'] for figure in figures],
+               'intersection_sides': len(overlap_corners), 'regions': int(len(regions))}
+    if details['figure_sides'] == [5, 5] and details['intersection_sides'] == 4:
+        return _result(1, confidence, "Two pentagons with a four-sided intersection", **details)
+    return _result(0, confidence, "Figures are not two pentagons with a four-sided intersection", **details)
+
+
+def score_drawings(paths, workers=None):
+    """Analyse many drawings across all cores; returns {path: result}."""
+    paths = list(paths)
+    workers = workers or os.cpu_count()
+    with spawn_pool(workers) as pool:
+        results = pool.map(analyze_drawing, paths, chunksize=max(1, len(paths) // (workers * 4)))
+        return dict(zip(paths, results))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: python pentagon_scoring.py <drawings_dir>")
+        sys.exit(1)
+    archive = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(sys.argv[1])
+               for name in sorted(names) if name.lower().endswith(IMAGE_TYPES)]
+    for path, result in score_drawings(archive).items():
+        print(json.dumps({'path': path, **result}))
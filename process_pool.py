@@ -0,0 +1,9 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def spawn_pool(max_workers, **kwargs):
+    """ProcessPoolExecutor whose workers start from a fresh interpreter and import only what their jobs need."""
+    # Spawned rather than forked: the Streamlit server process is multi-threaded, and a forked child
+    # would inherit whatever locks those threads held at the time
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'), **kwargs)
@@ -0,0 +1,74 @@
+import os
+
+import streamlit as st
+
+from transcoding import archive_path, preview_path, submit_transcode
+from uploads import save_upload, upload_digest
+
+RECORDINGS_DIR = "recordings"
+
+
+def _open_first(sources):
+    # The transcoding worker may drop the WAV at any moment, so try to open each copy in turn
+    # rather than check for it first; an open file stays readable after the unlink
+    for path, mime in sources:
+        try:
+            return open(path, "rb"), path, mime
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"No copy of the recording is left: {sources[0][0]}")
+
+
+def open_playback(path):
+    """Open the WAV, or the Opus preview (then the FLAC archive) once it has been dropped; returns (file, path, mime)."""
+    return _open_first([(path, "audio/wav"), (preview_path(path), "audio/ogg"), (archive_path(path), "audio/flac")])
+
+
+def open_download(path):
+    """Open the WAV, or the lossless FLAC archive once it has been dropped; returns (file, path, mime)."""
+    return _open_first([(path, "audio/wav"), (archive_path(path), "audio/flac")])
+
+
+def stored_recording(path):
+    """Where the recording is kept: the FLAC archive once the verified copy has replaced the WAV."""
+    if not os.path.exists(path) and os.path.exists(archive_path(path)):
+        return archive_path(path)
+    return path
+
+
+def recording_path(patient_id, digest):
+    return os.path.join(RECORDINGS_DIR, f"cookie_test_{patient_id}_{digest[:16]}.wav")
+
+
+def _recording_exists(path):
+    return os.path.exists(path) or os.path.exists(archive_path(path))
+
+
+def store_recording(upload, patient_id):
+    """Content-addressed save: identical uploads map to one file that is written once."""
+    path = recording_path(patient_id, upload_digest(upload))
+    if not _recording_exists(path):
+        save_upload(upload, path)
+        # Compressed copies are made off the script thread
+        submit_transcode(path)
+    return path
+
+
+def adopt_recording(tmp_path, patient_id):
+    """Move a finished WAV (e.g. from live capture) to its content-addressed name."""
+    with open(tmp_path, "rb") as f:
+        path = recording_path(patient_id, upload_digest(f))
+    if _recording_exists(path):
+        os.unlink(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+        submit_transcode(path)
+    return path
+
+
+def persist_recording(upload, patient_id):
+    # Reruns with the same upload (e.g. typing in the notes box) reuse the saved path
+    saved = st.session_state.setdefault('saved_recordings', {})
+    if upload.file_id not in saved:
+        saved[upload.file_id] = store_recording(upload, patient_id)
+    return saved[upload.file_id]
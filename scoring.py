@@ -0,0 +1,152 @@
+import numpy as np
+
+from flows import FLOWS, IMPAIRMENT_THRESHOLD, item_column, scored_items
+
+# Self-assessment answer keys
+SERIAL_SEVENS = [93, 86, 79, 72, 65]
+BACKWARDS_WORD = 'DLROW'
+OBJECTS = ['apple', 'table', 'coin']
+SEASONS = {
+    'winter': [12, 1, 2],
+    'spring': [3, 4, 5],
+    'summer': [6, 7, 8],
+    'fall': [9, 10, 11]
+}
+
+# Accepted spellings of each flow: the partition value or the exam type label
+FLOW_NAMES = {**{flow: flow for flow, _, _ in FLOWS.values()},
+              **{label: flow for label, (flow, _, _) in FLOWS.items()}}
+
+
+def _layout(flow, sections, max_score):
+    columns, starts, names, scales, caps = [], [], [], [], []
+    for spec in sections.values():
+        items = scored_items(spec)
+        if items:
+            starts.append(len(columns))
+            names.append(spec['name'])
+            scales.append(spec.get('scale', 1))
+            caps.append(spec.get('max_points', np.iinfo(np.int16).max))
+            columns.extend(item_column(flow, spec['name'], key) for key in items)
+    return {'columns': columns, 'starts': np.array(starts), 'sections': names,
+            'scales': np.array(scales, dtype=np.float64), 'caps': np.array(caps, dtype=np.int16),
+            'max_score': max_score}
+
+
+# flow -> item columns in section order, where each section starts, its rescaling and point cap
+LAYOUTS = {flow: _layout(flow, sections, max_score) for flow, sections, max_score in FLOWS.values()}
+
+
+def normalize_score(current_score, max_possible_score, target_score=30):
+    return round((current_score / max_possible_score) * target_score)
+
+
+def normalize_scores(scores, max_possible_score, target_score=30):
+    """Vectorized normalize_score(); rounds half to even exactly like round()."""
+    return np.round(np.asarray(scores) / max_possible_score * target_score).astype(np.int16)
+
+
+def section_points(raw_points, scale=1, max_points=None):
+    points = round(raw_points * scale)
+    return points if max_points is None else min(points, max_points)
+
+
+def section_points_batch(raw_points, scale=1, max_points=np.iinfo(np.int16).max):
+    return np.minimum(np.round(np.asarray(raw_points) * scale).astype(np.int16), max_points)
+
+
+def orientation_time(answers, local_time):
+    """Per-item results for the year/month/date/day/season answers against the patient's local time."""
+    current_season = next(s for s, months in SEASONS.items() if local_time.month in months)
+    return {
+        'year': int(str(local_time.year) == answers['year']),
+        'month': int(local_time.strftime('%B') == answers['month']),
+        'date': int(str(local_time.day) == answers['date']),
+        'day': int(local_time.strftime('%A') == answers['day']),
+        'season': int(current_season.lower() == answers['season'].lower())
+    }
+
+
+def _place_match(answer, detected, ignore=None):
+    if detected == 'Unknown':
+        # If location service failed, give point if they entered anything
+        return int(bool(answer.strip()))
+    if ignore:
+        return int(answer.lower().replace(ignore, "").strip() == detected.lower().replace(ignore, "").strip())
+    return int(answer.lower() == detected.lower())
+
+
+def orientation_place(answers, location):
+    """City/country/province results against the detected location."""
+    return {
+        'city': _place_match(answers['city'], location['city']),
+        'country': _place_match(answers['country'], location['country']),
+        'province': _place_match(answers['province'], location['state'], ignore="county")
+    }
+
+
+def registration(answers):
+    return {obj: int(answer.lower() == obj) for answer, obj in zip(answers, OBJECTS)}
+
+
+def registration_batch(answers):
+    """(n, 3) answers -> (n, 3) item results in OBJECTS order."""
+    return (np.char.lower(np.asarray(answers, dtype=str)) == np.array(OBJECTS)).astype(np.int8)
+
+
+def serial_sevens(responses):
+    return {f"serial7_{i + 1}": int(resp == corr) for i, (resp, corr) in enumerate(zip(responses, SERIAL_SEVENS))}
+
+
+def serial_sevens_batch(responses):
+    """(n, 5) subtraction answers -> (n, 5) item results."""
+    return (np.asarray(responses) == np.array(SERIAL_SEVENS)).astype(np.int8)
+
+
+def spelled_backwards(answer):
+    # Missing letters count as wrong, so every item is always recorded
+    letters = answer.upper().ljust(len(BACKWARDS_WORD))
+    return {f"dlrow_{i + 1}": int(a == b) for i, (a, b) in enumerate(zip(letters, BACKWARDS_WORD))}
+
+
+def spelled_backwards_batch(answers):
+    """n spelling attempts -> (n, 5) letter-by-letter results."""
+    width = len(BACKWARDS_WORD)
+    # Truncate then pad to exactly one character per letter position
+    letters = np.char.ljust(np.char.upper(np.asarray(answers, dtype=str)).astype(f'U{width}'), width)
+    return (letters.view('U1').reshape(-1, width) == np.array(list(BACKWARDS_WORD))).astype(np.int8)
+
+
+def recall(answers):
+    """Order-free recall: answers and objects are compared after sorting both."""
+    responses = sorted(answer.lower() for answer in answers)
+    return {obj: int(resp == obj) for resp, obj in zip(responses, sorted(OBJECTS))}
+
+
+def recall_batch(answers):
+    """(n, 3) answers -> (n, 3) item results in sorted(OBJECTS) order."""
+    responses = np.sort(np.char.lower(np.asarray(answers, dtype=str)), axis=1)
+    return (responses == np.array(sorted(OBJECTS))).astype(np.int8)
+
+
+def naming(pencil, watch):
+    return {'pencil': int(pencil.lower() == "pencil"), 'watch': int(watch.lower() == "watch")}
+
+
+def score_matrix(flow, items):
+    """Score a batch of one flow; items is an (n, len(LAYOUTS[flow]['columns'])) array of 0/1 item results."""
+    layout = LAYOUTS[flow]
+    items = np.asarray(items, dtype=np.int16)
+    if items.size and ((items != 0) & (items != 1)).any():
+        raise ValueError("Item results must be 0 or 1")
+    raw = np.add.reduceat(items, layout['starts'], axis=1) if items.shape[0] else \
+        np.zeros((0, len(layout['starts'])), dtype=np.int16)
+    domains = section_points_batch(raw, layout['scales'], layout['caps'])
+    score = domains.sum(axis=1, dtype=np.int16)
+    normalized = normalize_scores(score, layout['max_score'])
+    return {
+        'domains': domains,
+        'score': score,
+        'normalized_score': normalized,
+        'impaired': normalized <= IMPAIRMENT_THRESHOLD
+    }
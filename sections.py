@@ -0,0 +1,138 @@
+import streamlit as st
+
+from assets import show_stimulus
+from blob_store import blob_exists, blob_path, persist_blob, read_blob, thumbnail
+from flows import AWAITING
+from ledger import record_section
+from metrics import timed
+
+
+def next_page():
+    st.session_state.page += 1
+
+
+def next_page_from_fragment():
+    # A fragment rerun only redraws the fragment; the new page needs a full rerun
+    next_page()
+    st.rerun()
+
+
+def _registration_trials():
+    trials = st.number_input("Number of trials needed:", min_value=1, value=1)
+    st.session_state.responses['registration_trials'] = trials
+
+
+def _written_sentence():
+    patient_sentence = st.text_area("Record patient's sentence here:", "")
+    if patient_sentence:
+        st.session_state.responses['written_sentence'] = patient_sentence
+
+
+def session_drawing_score(handle):
+    # NumPy image analysis is loaded when the first drawing is uploaded
+    from pentagon_scoring import analyze_drawing
+
+    # Analyse each distinct drawing once per session, straight from the blob store
+    results = st.session_state.setdefault('drawing_results', {})
+    if handle['blob'] not in results:
+        results[handle['blob']] = analyze_drawing(blob_path(handle))
+    st.session_state.setdefault('responses', {})['drawing_analysis'] = results[handle['blob']]
+    return results[handle['blob']]
+
+
+def _drawing_upload():
+    uploads = st.session_state.setdefault('drawing_uploads', 0)
+    uploaded_file = st.file_uploader("Upload patient's drawing (optional)",
+                                     type=['png', 'jpg', 'jpeg'], key=f"drawing_upload_{uploads}")
+    if uploaded_file:
+        try:
+            st.session_state.responses['drawing'] = persist_blob(uploaded_file)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        # A fresh uploader: the stored drawing is shown from disk from now on
+        st.session_state.drawing_uploads = uploads + 1
+        st.rerun()
+
+    handle = st.session_state.responses.get('drawing')
+    if handle:
+        if not blob_exists(handle):
+            st.warning("The uploaded drawing is no longer available; please upload it again")
+            return
+        with timed('image', image='drawing_thumbnail'):
+            st.image(thumbnail(handle), caption=f"Patient's drawing ({handle['name']})")
+        if st.checkbox("Show full size", key="drawing_full_size"):
+            with timed('image', image='drawing'):
+                st.image(read_blob(handle))
+        analysis = session_drawing_score(handle)
+        verdict = "Copied Correctly" if analysis['score'] else "Copied Incorrectly"
+        st.info(f"Suggested: {verdict} ({analysis['confidence']:.0%} confidence) — {analysis['reason']}")
+        st.caption("Automated suggestion only; record your own evaluation above")
+
+
+EXTRAS = {
+    'registration_trials': _registration_trials,
+    'written_sentence': _written_sentence,
+    'drawing_upload': _drawing_upload
+}
+
+
+def render_items(page, spec):
+    st.subheader(spec['title'])
+    for line in spec.get('instructions', []):
+        st.write(line)
+    if 'caption' in spec:
+        st.caption(spec['caption'])
+    if 'image' in spec:
+        name, caption = spec['image']
+        show_stimulus(name, caption=caption)
+
+    render_item_group(page, spec)
+
+
+@st.fragment
+def render_item_group(page, spec):
+    # Answering an item reruns only this group, not the page header and checklist
+    all_answered = True
+    results = {}
+
+    for entry in spec['items']:
+        options = entry.get('options', spec['options'])
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.write(entry['prompt'])
+            caption = entry.get('caption', spec.get('item_caption'))
+            if caption:
+                st.caption(caption)
+        with col2:
+            response = st.radio(
+                entry['label'],
+                [AWAITING, *options],
+                key=entry['key'],
+                help=entry.get('help', spec.get('help'))
+            )
+            if response == AWAITING:
+                all_answered = False
+            results[entry['key']] = int(response == options[0])
+
+    for extra in spec.get('extras', []):
+        EXTRAS[extra]()
+
+    if not all_answered:
+        st.warning(spec['warning'])
+
+    if st.button(spec.get('button', "Next"), disabled=not all_answered, key=f"Page{page}"):
+        record_section(spec['name'], results)
+        st.session_state.completed_sections.add(page)
+        next_page_from_fragment()
+
+
+def render_section(sections, page, renderers):
+    """Render one page of a flow; 'items' sections are generic, other kinds come from renderers."""
+    spec = sections.get(page)
+    if spec is None:
+        return
+    if spec['kind'] == 'items':
+        render_items(page, spec)
+    else:
+        renderers[spec['kind']](spec)
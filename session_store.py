@@ -0,0 +1,137 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import streamlit as st
+
+from batch_writer import BatchWriter
+from ledger import empty_ledger
+from metrics import timed
+
+SESSION_DB = os.environ.get('MMSE_SESSION_DB', os.path.join("data", "sessions.sqlite3"))
+# The writer commits whatever has queued up at most this often
+FLUSH_INTERVAL = 0.2
+MAX_BATCH = 256
+# Longest a reader waits for entries queued before it (seconds); other sessions keep writing meanwhile
+READ_FLUSH_TIMEOUT = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_session ON journal (session_id, seq);
+"""
+
+_connections = threading.local()
+
+
+def connect(path=SESSION_DB):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    # WAL + NORMAL: commits are appended to the log and fsynced at checkpoints, not per write
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _commit_entries(entries):
+    # SQLite connections are bound to their thread; flush() may commit leftovers from the caller's
+    conn = getattr(_connections, 'conn', None)
+    if conn is None:
+        conn = _connections.conn = connect()
+    try:
+        with timed('file_io', op='journal_commit'), conn:
+            conn.executemany("INSERT INTO journal (session_id, recorded_at, state) VALUES (?, ?, ?)", entries)
+    except sqlite3.Error:
+        # Reconnect on the retry rather than reuse a connection in an unknown state
+        _connections.conn = None
+        conn.close()
+        raise
+
+
+_writer = BatchWriter(_commit_entries, 'session-journal', FLUSH_INTERVAL, MAX_BATCH)
+
+
+def flush(timeout=None):
+    """Block until every entry queued before the call has been committed (or dropped after failed retries).
+
+    Returns False if timeout passed first.
+    """
+    return _writer.flush(timeout)
+
+
+atexit.register(flush)
+
+
+def new_session_id():
+    return uuid.uuid4().hex[:12]
+
+
+def _snapshot():
+    responses = {key: value for key, value in st.session_state.responses.items()
+                 # Uploaded files are not journaled
+                 if not hasattr(value, 'read')}
+    return {
+        'exam_type': st.session_state.exam_type,
+        'page': st.session_state.page,
+        'score': st.session_state.score,
+        'ledger': st.session_state.get('ledger', empty_ledger()),
+        'completed_sections': sorted(st.session_state.get('completed_sections', set()), key=str),
+        'responses': responses
+    }
+
+
+def checkpoint():
+    """Journal the exam state if it changed since the last checkpoint of this session."""
+    if 'session_id' not in st.session_state:
+        return
+    state = json.dumps(_snapshot(), default=str, separators=(',', ':'))
+    if state == st.session_state.get('journaled_state'):
+        return
+    st.session_state.journaled_state = state
+    _writer.put((st.session_state.session_id, time.time(), state))
+
+
+def load_session(session_id, path=SESSION_DB):
+    flush(READ_FLUSH_TIMEOUT)
+    conn = connect(path)
+    try:
+        with timed('file_io', op='journal_read'):
+            row = conn.execute("SELECT state FROM journal WHERE session_id = ? ORDER BY seq DESC LIMIT 1",
+                               (session_id,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+
+def start_session():
+    st.session_state.session_id = new_session_id()
+    st.query_params['session'] = st.session_state.session_id
+
+
+def resume_session(session_id):
+    """Restore a journaled exam into session state; returns False if the ID is unknown."""
+    state = load_session(session_id)
+    if state is None:
+        return False
+    st.session_state.session_id = session_id
+    st.session_state.exam_type = state['exam_type']
+    st.session_state.page = state['page']
+    st.session_state.score = state['score']
+    # Journals written before the ledger existed only carry the total
+    st.session_state.ledger = state.get('ledger', empty_ledger())
+    st.session_state.completed_sections = set(state['completed_sections'])
+    st.session_state.responses = state['responses']
+    st.session_state.journaled_state = json.dumps(state, default=str, separators=(',', ':'))
+    st.query_params['session'] = session_id
+    return True
@@ -0,0 +1,40 @@
+import importlib
+import os
+import threading
+
+from metrics import timed
+
+# Opt-in: once the welcome screen has rendered, import what the flows will need in the background
+WARM_UP = os.environ.get('MMSE_WARM_UP') == '1'
+# Modules the app imports on first use, in the order the flows reach them
+LAZY_MODULES = (
+    'geolocation',       # requests; self-examination orientation pages
+    'timezones',         # timezonefinder, h3, pytz
+    'scoring',           # NumPy; self-examination answers
+    'pentagon_scoring',  # NumPy drawing analysis; examiner copying page
+    'fluency',           # av; cookie test
+    'live_capture',      # streamlit-webrtc, aiortc
+    'exports',           # pyarrow; summary pages
+    'patient_index',
+    'dashboard',         # pandas, altair
+)
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def preload_modules(modules=LAZY_MODULES):
+    for name in modules:
+        with timed('module_import', module=name):
+            importlib.import_module(name)
+
+
+def warm_up(modules=LAZY_MODULES):
+    """Start importing modules in a background thread; later calls are no-ops."""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is not None:
+            return
+        _warm_up_thread = threading.Thread(target=preload_modules, args=(modules,), name='module-warm-up',
+                                           daemon=True)
+    _warm_up_thread.start()
@@ -0,0 +1,206 @@
+import json
+
+import pyarrow as pa
+import pytest
+
+import metrics
+from app import ARROW_FILE, ARROW_STREAM, app
+from scoring import LAYOUTS
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    metrics.reset()
+    return app.test_client()
+
+
+def assessment(flow, session_id, value=1, exam_type=None, **overrides):
+    row = {'exam_type': exam_type or flow, 'session_id': session_id}
+    row.update(dict.fromkeys(LAYOUTS[flow]['columns'], value))
+    row.update(overrides)
+    return row
+
+
+def self_assessment(session_id, value=1, **overrides):
+    # The self-assessment gives one attention task; the other's items are null
+    dlrow = {column: None for column in LAYOUTS['self']['columns'] if '__dlrow_' in column}
+    return assessment('self', session_id, value, **{**dlrow, **overrides})
+
+
+def arrow_body(rows, mimetype=ARROW_STREAM):
+    columns = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    table = pa.table({column: [row.get(column) for row in rows] for column in columns})
+    sink = pa.BufferOutputStream()
+    new = pa.ipc.new_stream if mimetype == ARROW_STREAM else pa.ipc.new_file
+    with new(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def post_arrow(client, rows, mimetype=ARROW_STREAM):
+    return client.post('/score', data=arrow_body(rows, mimetype), content_type=mimetype)
+
+
+def read_arrow(response):
+    return pa.ipc.open_stream(response.data).read_all().to_pylist()
+
+
+def test_score_json(client):
+    rows = [assessment('examiner', 'a'), self_assessment('b'),
+            assessment('examiner', 'c', 0, exam_type="With Examiner"), self_assessment('d', 0)]
+    response = client.post('/score', json={'assessments': rows})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [(r['session_id'], r['exam_type'], r['score'], r['normalized_score'], r['impaired'])
+            for r in results] == [('a', 'examiner', 30, 30, False), ('b', 'self', 24, 30, False),
+                                  ('c', 'examiner', 0, 0, True), ('d', 'self', 0, 0, True)]
+    assert results[1]['domains'] == {"Orientation - Time": 6, "Orientation - Place": 5, "Registration": 3,
+                                     "Attention and Calculation": 5, "Recall": 3, "Language - Naming": 2}
+
+
+def test_score_json_bare_list(client):
+    response = client.post('/score', json=[assessment('examiner', 'a')])
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['score'] == 30
+
+
+@pytest.mark.parametrize('mimetype', [ARROW_STREAM, ARROW_FILE])
+def test_score_arrow(client, mimetype):
+    response = post_arrow(client, [assessment('examiner', 'a', 1), self_assessment('b', 1)], mimetype)
+    assert response.status_code == 200
+    assert response.mimetype == ARROW_STREAM
+    rows = read_arrow(response)
+    assert [(row['session_id'], row['exam_type'], row['score']) for row in rows] == [('a', 'examiner', 30),
+                                                                                   ('b', 'self', 24)]
+    # Domains of the other flow are null
+    assert rows[0]['self__recall'] is None and rows[1]['self__recall'] == 3
+
+
+def test_score_json_matches_arrow(client):
+    rows = [self_assessment('a', 1, **{'self__recall__apple': 0, 'self__registration__coin': None})]
+    from_json = client.post('/score', json=rows).get_json()['results'][0]
+    from_arrow = read_arrow(post_arrow(client, rows))[0]
+    assert from_json['score'] == from_arrow['score'] == 22
+
+
+@pytest.mark.parametrize('value', [0.7, 2, -1, "1", True])
+def test_score_json_rejects_non_binary(client, value):
+    rows = [assessment('examiner', 'a', **{'examiner__recall__recall_apple': value})]
+    response = client.post('/score', json=rows)
+    assert response.status_code == 400
+    assert 'examiner__recall__recall_apple' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('value', [0.7, 2, -1, "1"])
+def test_score_arrow_rejects_non_binary(client, value):
+    rows = [assessment('examiner', 'a', **{'examiner__recall__recall_apple': value})]
+    response = post_arrow(client, rows)
+    assert response.status_code == 400
+    assert 'examiner__recall__recall_apple' in response.get_json()['error']
+
+
+def misspelled(flow):
+    row = assessment(flow, 'a')
+    row['examiner__recall__recall_aple'] = row.pop('examiner__recall__recall_apple')
+    return row
+
+
+def missing(flow):
+    row = assessment(flow, 'a')
+    del row['examiner__naming__name_watch']
+    return row
+
+
+@pytest.mark.parametrize('make_row, error', [
+    (misspelled, "Unknown columns: examiner__recall__recall_aple"),
+    (missing, "Missing item columns: examiner__naming__name_watch"),
+])
+def test_score_rejects_column_errors(client, make_row, error):
+    rows = [make_row('examiner')]
+    for response in (client.post('/score', json=rows), post_arrow(client, rows)):
+        assert response.status_code == 400
+        assert response.get_json()['error'] == error
+
+
+def test_score_rejects_items_of_another_flow(client):
+    rows = [self_assessment('a', **{'examiner__naming__name_watch': 1})]
+    assert client.post('/score', json=rows).status_code == 400
+    assert post_arrow(client, rows).status_code == 400
+
+
+def test_score_rejects_unknown_exam_type(client):
+    response = client.post('/score', json=[{'exam_type': 'telephone'}])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "Unknown exam_type: telephone"
+
+
+@pytest.mark.parametrize('body', [{'assessments': 'x'}, [1, 2], "not json"])
+def test_score_rejects_malformed_json(client, body):
+    response = client.post('/score', data=json.dumps(body) if body != "not json" else body,
+                           content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_score_rejects_malformed_arrow(client):
+    response = client.post('/score', data=b'not arrow', content_type=ARROW_STREAM)
+    assert response.status_code == 400
+
+
+def test_metrics_json(client):
+    client.get('/')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    rows = response.get_json()['metrics']
+    handler = [row for row in rows if row['name'] == 'http_handler' and row['endpoint'] == 'hello_world']
+    assert handler and handler[0]['count'] == 1 and handler[0]['status'] == '200'
+
+
+def test_metrics_prometheus(client):
+    client.get('/')
+    response = client.get('/metrics?format=prometheus')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'mmse_http_handler_seconds_count{endpoint="hello_world",status="200"} 1' in response.text
+
+
+def test_metrics_merges_other_processes(client, tmp_path):
+    metrics.observe('file_io', 0.002, op='journal_commit')
+    metrics.publish()
+    with open(metrics._snapshot_path()) as f:
+        published = json.load(f)
+    # The same histograms published by another server process
+    (tmp_path / "otherhost-1.json").write_text(json.dumps(published))
+    rows = client.get('/metrics').get_json()['metrics']
+    assert [row['count'] for row in rows if row['name'] == 'file_io'] == [2]
+
+
+def test_metrics_deletes_stale_snapshots(client, tmp_path):
+    stale = tmp_path / "otherhost-2.json"
+    stale.write_text(json.dumps({'published_at': 0, 'series': []}))
+    assert client.get('/metrics').status_code == 200
+    assert not stale.exists()
+
+
+class StopLoop(BaseException):
+    pass
+
+
+def test_metrics_publisher_survives_errors(monkeypatch):
+    calls = []
+
+    def failing_publish():
+        calls.append(1)
+        raise OSError("disk full")
+
+    def sleep(seconds):
+        if len(calls) == 3:
+            raise StopLoop
+
+    monkeypatch.setattr(metrics, 'publish', failing_publish)
+    monkeypatch.setattr(metrics.time, 'sleep', sleep)
+    with pytest.raises(StopLoop):
+        metrics._publish_loop()
+    assert len(calls) == 3
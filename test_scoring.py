@@ -0,0 +1,387 @@
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from flows import FLOWS, scored_items
+from scoring import (LAYOUTS, naming, normalize_score, normalize_scores, orientation_place, orientation_time, recall,
+                     recall_batch, registration, registration_batch, score_matrix, section_points,
+                     section_points_batch, serial_sevens, serial_sevens_batch, spelled_backwards,
+                     spelled_backwards_batch)
+
+# The self-assessment rules as written inline in render_self_assessment before they moved into scoring
+# (mmse_app.py at d16d37f). Each returns what the page added to st.session_state.score.
+
+
+def baseline_normalize_score(current_score, max_possible_score, target_score=30):
+    return round((current_score / max_possible_score) * target_score)
+
+
+def baseline_orientation_time(year, month, date, season, day, local_time):
+    # Score calculation
+    score = 0
+    if str(local_time.year) == year:
+        score += 1
+    if local_time.strftime('%B') == month:
+        score += 1
+    if str(local_time.day) == date:
+        score += 1
+    if local_time.strftime('%A') == day:
+        score += 1
+
+    # Season scoring (adjusted as per requirement 3.2)
+    seasons = {
+        'winter': [12, 1, 2],
+        'spring': [3, 4, 5],
+        'summer': [6, 7, 8],
+        'fall': [9, 10, 11]
+    }
+    current_season = next(s for s, months in seasons.items()
+                          if local_time.month in months)
+    if current_season.lower() == season.lower():
+        score += 1
+
+    # Adjust score as per requirement 3.2
+    season_score = score * (5 / 4)
+    return round(season_score)
+
+
+def baseline_orientation_place(city_input, country, province, location_data):
+    score = 0
+    # Auto-score city based on GPS if available
+    if location_data['city'] != 'Unknown':
+        if city_input.lower() == location_data['city'].lower():
+            score += 1
+    else:
+        # If location service failed, give point if they entered anything
+        if city_input.strip():
+            score += 1
+    if location_data['country'] != 'Unknown':
+        if country.lower() == location_data['country'].lower():
+            score += 1
+    else:
+        # If location service failed, give point if they entered anything
+        if country.strip():
+            score += 1
+    if location_data['state'] != 'Unknown':
+        if province.lower().replace("county", "").strip() == location_data['state'].lower().replace("county",
+                                                                                                    "").strip():
+            score += 1
+    else:
+        # If location service failed, give point if they entered anything
+        if province.strip():
+            score += 1
+
+    # Adjust score as per requirement 3.5
+    final_score = round(score * (5 / 3))
+    return final_score
+
+
+def baseline_registration(response1, response2, response3):
+    responses = [response1.lower(), response2.lower(), response3.lower()]
+    correct = ['apple', 'table', 'coin']
+    score = sum(1 for resp, corr in zip(responses, correct)
+                if resp == corr)
+    return score
+
+
+def baseline_serial_sevens(responses):
+    correct = [93, 86, 79, 72, 65]
+    score = sum(1 for resp, corr in zip(responses, correct)
+                if resp == corr)
+    return score
+
+
+def baseline_spelled_backwards(backwards_spelling):
+    score = sum(1 for a, b in zip(backwards_spelling.upper(), 'DLROW')
+                if a == b)
+    return score
+
+
+def baseline_recall(recall1, recall2, recall3):
+    responses = sorted([recall1.lower(), recall2.lower(), recall3.lower()])
+    correct = sorted(['apple', 'table', 'coin'])
+    score = sum(1 for resp, corr in zip(responses, correct)
+                if resp == corr)
+    return score
+
+
+def baseline_naming(pencil, watch):
+    score = 0
+    if pencil.lower() == "pencil":
+        score += 1
+    if watch.lower() == "watch":
+        score += 1
+    return score
+
+
+@pytest.mark.parametrize('answer', [
+    'd', 'dl', 'DLR', 'dlro',  # short: missing letters are wrong
+    'dlrow', 'DLROW', 'DlRoW', 'world', 'dlraw', ' dlro',
+    'dlroww', 'DLROWDLROW', 'dlrow and more',  # long: only the first five letters count
+    'ßdlrow', 'dlroß',  # upper-casing changes the length
+])
+def test_spelled_backwards(answer):
+    results = spelled_backwards(answer)
+    assert len(results) == 5
+    assert sum(results.values()) == baseline_spelled_backwards(answer)
+    assert spelled_backwards_batch([answer])[0].tolist() == list(results.values())
+
+
+@pytest.mark.parametrize('answers', [
+    ['apple', 'table', 'coin'],
+    ['coin', 'apple', 'table'],  # any order
+    ['Table', 'COIN', 'apple'],
+    ['apple', 'apple', 'apple'],
+    ['pear', 'table', 'coin'],
+    ['coin', 'pear', 'zebra'],
+    ['', 'table', 'coin'],
+])
+def test_recall(answers):
+    results = recall(answers)
+    assert sum(results.values()) == baseline_recall(*answers)
+    assert recall_batch([answers])[0].tolist() == list(results.values())
+
+
+@pytest.mark.parametrize('answers', [
+    ['apple', 'table', 'coin'],
+    ['APPLE', 'Table', 'coin'],
+    ['table', 'apple', 'coin'],  # order matters on registration
+    ['apple', 'penny', 'coin'],
+])
+def test_registration(answers):
+    results = registration(answers)
+    assert sum(results.values()) == baseline_registration(*answers)
+    assert registration_batch([answers])[0].tolist() == list(results.values())
+
+
+@pytest.mark.parametrize('responses', [
+    [93, 86, 79, 72, 65],
+    [93, 85, 78, 71, 64],
+    [0, 0, 0, 0, 0],
+    [65, 72, 79, 86, 93],
+])
+def test_serial_sevens(responses):
+    results = serial_sevens(responses)
+    assert sum(results.values()) == baseline_serial_sevens(responses)
+    assert serial_sevens_batch([responses])[0].tolist() == list(results.values())
+
+
+@pytest.mark.parametrize('pencil, watch', [
+    ('pencil', 'watch'), ('PENCIL', 'Watch'), ('pen', 'watch'), ('pencil', 'clock'), ('watch', 'pencil'),
+    (' pencil', 'watch '),  # no trimming
+])
+def test_naming(pencil, watch):
+    results = naming(pencil, watch)
+    assert list(results) == ['pencil', 'watch']
+    assert sum(results.values()) == baseline_naming(pencil, watch)
+
+
+SELF_SECTIONS = {spec['name']: spec for spec in FLOWS["Self Examination"][1].values()}
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SEASON_CHOICES = ['Spring', 'Summer', 'Fall', 'Winter']
+
+
+def time_answers(rng, local_time):
+    # Each answer is right about half the time
+    return {
+        'year': rng.choice([str(local_time.year), str(local_time.year - 1)]),
+        'month': rng.choice([local_time.strftime('%B'), rng.choice(MONTHS)]),
+        'date': rng.choice([str(local_time.day), str(local_time.day % 28 + 1), f"0{local_time.day}"]),
+        'season': rng.choice(SEASON_CHOICES),
+        'day': rng.choice([local_time.strftime('%A'), rng.choice(DAYS)])
+    }
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_orientation_time(seed):
+    rng = random.Random(seed)
+    spec = SELF_SECTIONS["Orientation - Time"]
+    for _ in range(50):
+        local_time = datetime(rng.randint(2020, 2030), rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23))
+        answers = time_answers(rng, local_time)
+        results = orientation_time(answers, local_time)
+        assert list(results) == spec['scored_items']
+        # What the page records: the rescaled sum of the items
+        assert section_points(sum(results.values()), spec['scale']) == baseline_orientation_time(
+            answers['year'], answers['month'], answers['date'], answers['season'], answers['day'], local_time)
+
+
+def test_orientation_time_all_correct():
+    local_time = datetime(2026, 10, 18, 9)
+    answers = {'year': "2026", 'month': "October", 'date': "18", 'season': "fall", 'day': "Sunday"}
+    assert orientation_time(answers, local_time) == dict.fromkeys(['year', 'month', 'date', 'day', 'season'], 1)
+    # 5 items at 5/4 each: the page has always awarded 6 for a perfect answer
+    assert section_points(5, 5 / 4) == baseline_orientation_time("2026", "October", "18", "fall", "Sunday",
+                                                                 local_time) == 6
+
+
+@pytest.mark.parametrize('answers, location', [
+    (("Nairobi", "Kenya", "Nairobi County"), {'city': "Nairobi", 'country': "Kenya", 'state': "Nairobi"}),
+    (("nairobi", "KENYA", "nairobi"), {'city': "Nairobi", 'country': "Kenya", 'state': "Nairobi County"}),
+    (("Mombasa", "Kenya", "Kiambu"), {'city': "Nairobi", 'country': "Kenya", 'state': "Nairobi"}),
+    ((" Nairobi", "Kenya ", " Nairobi "), {'city': "Nairobi", 'country': "Kenya", 'state': "Nairobi"}),
+    (("anything", "at all", "here"), {'city': "Unknown", 'country': "Unknown", 'state': "Unknown"}),
+    (("Nairobi", " ", "x"), {'city': "Unknown", 'country': "Unknown", 'state': "Unknown"}),
+    (("Nairobi", "Uganda", "Nairobi"), {'city': "Nairobi", 'country': "Kenya", 'state': "Unknown"}),
+    (("Orange", "USA", "Orange County"), {'city': "Orange", 'country': "USA", 'state': "Orange County"}),
+])
+def test_orientation_place(answers, location):
+    spec = SELF_SECTIONS["Orientation - Place"]
+    city, country, province = answers
+    results = orientation_place({'city': city, 'country': country, 'province': province}, location)
+    assert list(results) == spec['scored_items']
+    assert section_points(sum(results.values()), spec['scale']) == baseline_orientation_place(
+        city, country, province, location)
+
+
+@pytest.mark.parametrize('scale, raw_max', [(5 / 4, 5), (5 / 3, 3), (1, 5)])
+def test_section_points(scale, raw_max):
+    raw = list(range(raw_max + 1))
+    expected = [round(points * scale) for points in raw]
+    assert [section_points(points, scale) for points in raw] == expected
+    assert section_points_batch(raw, scale).tolist() == expected
+
+
+def test_section_points_round_half_to_even():
+    # 2 of 4 items at 5/4 is 2.5 points
+    assert section_points(2, 5 / 4) == 2
+    assert section_points_batch([2], 5 / 4).tolist() == [2]
+
+
+def test_section_points_cap():
+    assert [section_points(points, 1, 5) for points in range(11)] == [min(points, 5) for points in range(11)]
+    assert section_points_batch(np.arange(11), 1, 5).tolist() == [min(points, 5) for points in range(11)]
+
+
+@pytest.mark.parametrize('max_score', [24, 30])
+def test_normalize_score(max_score):
+    scores = list(range(max_score + 1))
+    expected = [baseline_normalize_score(score, max_score) for score in scores]
+    assert [normalize_score(score, max_score) for score in scores] == expected
+    assert normalize_scores(scores, max_score).tolist() == expected
+
+
+def test_normalize_score_round_half_to_even():
+    # 2/24 and 6/24 of 30 are 2.5 and 7.5
+    assert normalize_score(2, 24) == 2
+    assert normalize_score(6, 24) == 8
+    assert normalize_scores([2, 6], 24).tolist() == [2, 8]
+
+
+def random_self_exam(rng):
+    """Answers to every scored self-assessment page, plus what the UI records for each section."""
+    local_time = datetime(2026, rng.randint(1, 12), rng.randint(1, 28), 12)
+    location = rng.choice([{'city': "Nairobi", 'country': "Kenya", 'state': "Nairobi"},
+                           {'city': "Unknown", 'country': "Unknown", 'state': "Unknown"}])
+    objects = ['apple', 'table', 'coin', 'penny', 'pear', '']
+    time = time_answers(rng, local_time)
+    place = {key: rng.choice(["Nairobi", "Kenya", "Mombasa", " "]) for key in ('city', 'country', 'province')}
+    registered = [rng.choice(objects) for _ in range(3)]
+    recalled = [rng.choice(objects) for _ in range(3)]
+    sevens = [rng.choice([correct, correct - 1]) for correct in (93, 86, 79, 72, 65)]
+    spelling = rng.choice(['dlrow', 'DLROW', 'dlraw', 'world', 'dlr', 'dlrowx'])
+    pencil, watch = rng.choice(['pencil', 'pen']), rng.choice(['watch', 'Watch', 'clock'])
+
+    # The attention page records whichever one task the patient chose
+    attention = serial_sevens(sevens) if rng.random() < 0.5 else spelled_backwards(spelling)
+    attention_baseline = baseline_serial_sevens(sevens) if 'serial7_1' in attention else \
+        baseline_spelled_backwards(spelling)
+    items = {
+        "Orientation - Time": orientation_time(time, local_time),
+        "Orientation - Place": orientation_place(place, location),
+        "Registration": registration(registered),
+        "Attention and Calculation": attention,
+        "Recall": recall(recalled),
+        "Language - Naming": naming(pencil, watch)
+    }
+    baseline = [
+        baseline_orientation_time(time['year'], time['month'], time['date'], time['season'], time['day'],
+                                  local_time),
+        baseline_orientation_place(place['city'], place['country'], place['province'], location),
+        baseline_registration(*registered),
+        attention_baseline,
+        baseline_recall(*recalled),
+        baseline_naming(pencil, watch)
+    ]
+    return items, baseline
+
+
+def ui_section_points(spec, results):
+    # The pages record rescaled sections through section_points() and every other section as its item sum
+    if 'scale' in spec:
+        return section_points(sum(results.values()), spec['scale'])
+    return sum(results.values())
+
+
+def item_row(flow, sections, items):
+    """One score_matrix row: the recorded items in LAYOUTS column order, unasked items 0."""
+    values = {}
+    for spec in sections.values():
+        for key, points in items.get(spec['name'], {}).items():
+            values[(spec['name'], key)] = points
+    layout = LAYOUTS[flow]
+    keys = [(spec['name'], key) for spec in sections.values() for key in scored_items(spec)]
+    assert len(keys) == len(layout['columns'])
+    return [values.get(key, 0) for key in keys]
+
+
+def test_score_matrix_matches_self_assessment_pages():
+    rng = random.Random(0)
+    flow, sections, max_score = FLOWS["Self Examination"]
+    rows, expected = [], []
+    for _ in range(500):
+        items, baseline = random_self_exam(rng)
+        ui = [ui_section_points(SELF_SECTIONS[name], results) for name, results in items.items()]
+        assert ui == baseline
+        rows.append(item_row(flow, sections, items))
+        expected.append(ui)
+
+    scored = score_matrix(flow, rows)
+    expected = np.array(expected)
+    assert LAYOUTS[flow]['sections'] == list(items)
+    assert scored['domains'].tolist() == expected.tolist()
+    assert scored['score'].tolist() == expected.sum(axis=1).tolist()
+    normalized = [baseline_normalize_score(total, max_score) for total in expected.sum(axis=1).tolist()]
+    assert scored['normalized_score'].tolist() == normalized
+    assert scored['impaired'].tolist() == [score <= 23 for score in normalized]
+
+
+def test_score_matrix_matches_examiner_pages():
+    rng = random.Random(1)
+    flow, sections, max_score = FLOWS["With Examiner"]
+    scored_sections = [spec for spec in sections.values() if scored_items(spec)]
+    rows, totals = [], []
+    for _ in range(500):
+        # Each item radio records 1 for the first (correct) option
+        items = {spec['name']: {key: rng.randint(0, 1) for key in scored_items(spec)} for spec in scored_sections}
+        rows.append(item_row(flow, sections, items))
+        totals.append(sum(ui_section_points(spec, items[spec['name']]) for spec in scored_sections))
+
+    scored = score_matrix(flow, rows)
+    assert scored['score'].tolist() == totals
+    assert scored['normalized_score'].tolist() == [normalize_score(total, max_score) for total in totals]
+
+
+def test_layout_totals():
+    # A perfect exam scores each flow's raw maximum except for the rescaled self-assessment orientation
+    for flow, sections, max_score in FLOWS.values():
+        layout = LAYOUTS[flow]
+        perfect = score_matrix(flow, np.ones((1, len(layout['columns']))))
+        caps = {spec['name']: spec.get('max_points') for spec in sections.values()}
+        expected = [section_points(len(scored_items(spec)), spec.get('scale', 1), caps[spec['name']])
+                    for spec in sections.values() if scored_items(spec)]
+        assert perfect['domains'][0].tolist() == expected
+        assert perfect['score'][0] == sum(expected)
+    assert score_matrix('examiner', np.ones((1, len(LAYOUTS['examiner']['columns']))))['score'][0] == 30
+    # 6 + 5 + 3 + 5 + 3 + 2: a perfect self-assessment has always scored 24 raw
+    assert score_matrix('self', np.ones((1, len(LAYOUTS['self']['columns']))))['score'][0] == 24
+
+
+def test_score_matrix_rejects_non_binary():
+    with pytest.raises(ValueError):
+        score_matrix('self', np.full((1, len(LAYOUTS['self']['columns'])), 2))
@@ -0,0 +1,67 @@
+import threading
+from datetime import datetime
+
+import h3
+import pytz
+from cachetools import LRUCache
+from timezonefinder import TimezoneFinder
+
+from metrics import timed
+
+# ~0.1 km² cells: small enough that only points right on a border share a cell
+H3_RESOLUTION = 9
+
+_finder = None
+_finder_lock = threading.Lock()
+_warm_up_thread = None
+_timezone_cache = LRUCache(maxsize=4096)
+_cache_lock = threading.Lock()
+
+
+def timezone_finder():
+    """Process-wide TimezoneFinder, created on first use."""
+    global _finder
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                with timed('timezone_load'):
+                    _finder = TimezoneFinder()
+    return _finder
+
+
+def warm_up_timezones():
+    # Load the polygon data in the background so the first page 2 render doesn't pay for it
+    global _warm_up_thread
+    with _cache_lock:
+        if _warm_up_thread is not None or _finder is not None:
+            return
+        _warm_up_thread = threading.Thread(target=timezone_finder, name='timezone-warm-up', daemon=True)
+    _warm_up_thread.start()
+
+
+def timezone_at(lat, lon):
+    try:
+        cell = h3.latlng_to_cell(lat, lon, H3_RESOLUTION)
+    except Exception:
+        return None
+
+    with _cache_lock:
+        if cell in _timezone_cache:
+            return _timezone_cache[cell]
+
+    finder = timezone_finder()
+    # TimezoneFinder reads its data files with shared file handles
+    with _finder_lock, timed('timezone_lookup'):
+        timezone_str = finder.timezone_at(lat=lat, lng=lon)
+
+    with _cache_lock:
+        _timezone_cache[cell] = timezone_str
+    return timezone_str
+
+
+def get_local_time(lat, lon):
+    timezone_str = timezone_at(lat, lon)
+    if timezone_str:
+        timezone = pytz.timezone(timezone_str)
+        return datetime.now(timezone)
+    return datetime.now()
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import deque
+
+from process_pool import spawn_pool
+
+# Retention policy: drop the WAV once its FLAC copy has been verified
+KEEP_WAV = os.environ.get('MMSE_KEEP_WAV', '0') == '1'
+PREVIEW_BIT_RATE = 24000
+PREVIEW_SAMPLE_RATE = 48000
+MAX_WORKERS = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'queued': 0, 'completed': 0, 'failed': 0, 'bytes_saved': 0}
+_latencies = deque(maxlen=200)
+
+
+def archive_path(wav_path):
+    return os.path.splitext(wav_path)[0] + '.flac'
+
+
+def preview_path(wav_path):
+    return os.path.splitext(wav_path)[0] + '.preview.ogg'
+
+
+def _encode(src, dst, codec, rate=None, layout=None, bit_rate=None):
+    # Only the transcoding workers need av; the app process that queues jobs never loads it
+    import av
+
+    tmp = dst + '.part'
+    with av.open(src) as inp, av.open(tmp, 'w', format=os.path.splitext(dst)[1][1:]) as out:
+        in_stream = inp.streams.audio[0]
+        out_stream = out.add_stream(codec, rate=rate or in_stream.rate)
+        out_stream.layout = layout or in_stream.layout.name
+        if bit_rate:
+            out_stream.bit_rate = bit_rate
+        for frame in inp.decode(in_stream):
+            frame.pts = None
+            for packet in out_stream.encode(frame):
+                out.mux(packet)
+        for packet in out_stream.encode(None):
+            out.mux(packet)
+    os.replace(tmp, dst)
+
+
+def _sample_count(path):
+    import av
+
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        return sum(frame.samples for frame in container.decode(stream))
+
+
+def transcode_recording(wav_path, keep_wav=KEEP_WAV):
+    """Runs in a worker process: FLAC archive, Opus preview, then apply the retention policy."""
+    started = time.perf_counter()
+    archive, preview = archive_path(wav_path), preview_path(wav_path)
+    _encode(wav_path, archive, 'flac')
+    _encode(wav_path, preview, 'libopus', rate=PREVIEW_SAMPLE_RATE, layout='mono', bit_rate=PREVIEW_BIT_RATE)
+
+    # Lossless copy must decode to exactly as many samples as the source
+    verified = _sample_count(archive) == _sample_count(wav_path)
+    wav_bytes = os.path.getsize(wav_path)
+    archive_bytes = os.path.getsize(archive)
+    wav_removed = verified and not keep_wav
+    if wav_removed:
+        os.unlink(wav_path)
+
+    return {
+        'source': wav_path,
+        'archive': archive,
+        'preview': preview,
+        'verified': verified,
+        'wav_removed': wav_removed,
+        'bytes_saved': wav_bytes - archive_bytes if wav_removed else 0,
+        'seconds': time.perf_counter() - started
+    }
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = spawn_pool(MAX_WORKERS)
+        return _pool
+
+
+def _job_done(future):
+    with _stats_lock:
+        _stats['queued'] -= 1
+        if future.cancelled() or future.exception() is not None:
+            _stats['failed'] += 1
+            return
+        result = future.result()
+        _stats['completed'] += 1
+        _stats['bytes_saved'] += result['bytes_saved']
+        _latencies.append(result['seconds'])
+
+
+def submit_transcode(wav_path):
+    with _stats_lock:
+        _stats['queued'] += 1
+    future = _get_pool().submit(transcode_recording, wav_path)
+    future.add_done_callback(_job_done)
+    return future
+
+
+def transcode_stats():
+    with _stats_lock:
+        latencies = sorted(_latencies)
+        stats = {
+            'queue_depth': _stats['queued'],
+            'completed': _stats['completed'],
+            'failed': _stats['failed'],
+            'bytes_saved': _stats['bytes_saved']
+        }
+    if latencies:
+        stats['mean_job_seconds'] = round(sum(latencies) / len(latencies), 3)
+        stats['p95_job_seconds'] = round(latencies[int(0.95 * (len(latencies) - 1))], 3)
+    return stats
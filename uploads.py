@@ -0,0 +1,38 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from metrics import timed
+
+CHUNK_SIZE = 64 * 1024
+
+
+def save_upload(upload, path, chunk_size=CHUNK_SIZE):
+    """Stream an upload to path in fixed-size chunks through a temp file and an atomic rename."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with timed('file_io', op='upload_write'), os.fdopen(fd, "wb") as f:
+            upload.seek(0)
+            shutil.copyfileobj(upload, f, chunk_size)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def upload_digest(upload, chunk_size=CHUNK_SIZE):
+    """SHA-256 of a file-like object, read in chunks; leaves it rewound."""
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for chunk in iter(lambda: upload.read(chunk_size), b""):
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()